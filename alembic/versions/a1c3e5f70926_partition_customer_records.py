@@ -0,0 +1,101 @@
+"""partition customer_records by analysis_id
+
+Revision ID: a1c3e5f70926
+Revises:
+Create Date: 2026-10-18 09:12:41.381204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import uuid
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f70926'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = (
+    "id, analysis_id, customer_id, recency_value, frequency_value, monetary_value, "
+    "recency_score, frequency_score, monetary_score, rfm_score, segment, original_data, created_at"
+)
+
+
+def _partition_name(analysis_id: str) -> str:
+    """Mirror of backend.database.customer_records_partition_name."""
+    return f"customer_records_{uuid.UUID(analysis_id).hex}"
+
+
+def _customer_records_columns(partitioned: bool):
+    columns = [
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('analysis_id', sa.String(), sa.ForeignKey('rfm_analyses.id'), nullable=False),
+        sa.Column('customer_id', sa.String(), nullable=False),
+        sa.Column('recency_value', sa.Float(), nullable=False),
+        sa.Column('frequency_value', sa.Integer(), nullable=False),
+        sa.Column('monetary_value', sa.Float(), nullable=False),
+        sa.Column('recency_score', sa.Integer(), nullable=False),
+        sa.Column('frequency_score', sa.Integer(), nullable=False),
+        sa.Column('monetary_score', sa.Integer(), nullable=False),
+        sa.Column('rfm_score', sa.Integer(), nullable=False),
+        sa.Column('segment', sa.String(), nullable=False),
+        sa.Column('original_data', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint(*(('id', 'analysis_id') if partitioned else ('id',))),
+    ]
+    if partitioned:
+        columns.append(sa.UniqueConstraint('analysis_id', 'customer_id', name='uq_analysis_customer'))
+    return columns
+
+
+def _create_partitioned_table() -> None:
+    op.create_table(
+        'customer_records',
+        *_customer_records_columns(partitioned=True),
+        postgresql_partition_by='LIST (analysis_id)'
+    )
+    op.create_index('idx_customer_segment', 'customer_records', ['segment'])
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('customer_records'):
+        # Fresh database: create the partitioned parent here too, so it never depends on create_all
+        _create_partitioned_table()
+        return
+
+    # Move the heap table out of the way, freeing its index and constraint names
+    op.rename_table('customer_records', 'customer_records_heap')
+    op.execute("ALTER TABLE customer_records_heap RENAME CONSTRAINT customer_records_pkey TO customer_records_heap_pkey")
+    op.drop_constraint('uq_analysis_customer', 'customer_records_heap', type_='unique')
+    op.drop_index('idx_customer_analysis', table_name='customer_records_heap')
+    op.drop_index('idx_customer_segment', table_name='customer_records_heap')
+
+    _create_partitioned_table()
+
+    # One partition per existing analysis, then copy its rows across
+    analysis_ids = [row[0] for row in bind.execute(sa.text("SELECT id FROM rfm_analyses"))]
+    for analysis_id in analysis_ids:
+        op.execute(
+            f"CREATE TABLE {_partition_name(analysis_id)} "
+            f"PARTITION OF customer_records FOR VALUES IN ('{analysis_id}')"
+        )
+    op.execute(f"INSERT INTO customer_records ({COLUMNS}) SELECT {COLUMNS} FROM customer_records_heap")
+
+    op.drop_table('customer_records_heap')
+
+
+def downgrade() -> None:
+    op.create_table('customer_records_heap', *_customer_records_columns(partitioned=False))
+    op.execute(f"INSERT INTO customer_records_heap ({COLUMNS}) SELECT {COLUMNS} FROM customer_records")
+
+    # Dropping the parent also drops every partition
+    op.drop_table('customer_records')
+
+    op.rename_table('customer_records_heap', 'customer_records')
+    op.execute("ALTER TABLE customer_records RENAME CONSTRAINT customer_records_heap_pkey TO customer_records_pkey")
+    op.create_unique_constraint('uq_analysis_customer', 'customer_records', ['analysis_id', 'customer_id'])
+    op.create_index('idx_customer_analysis', 'customer_records', ['analysis_id'])
+    op.create_index('idx_customer_segment', 'customer_records', ['segment'])
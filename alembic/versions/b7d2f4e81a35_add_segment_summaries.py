@@ -0,0 +1,65 @@
+"""add segment_summaries
+
+Revision ID: b7d2f4e81a35
+Revises: a1c3e5f70926
+Create Date: 2026-10-18 10:03:27.554910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f4e81a35'
+down_revision = 'a1c3e5f70926'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'segment_summaries',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('analysis_id', sa.String(), sa.ForeignKey('rfm_analyses.id'), nullable=False),
+        sa.Column('segment', sa.String(), nullable=False),
+        sa.Column('customer_count', sa.Integer(), nullable=False),
+        sa.Column('recency_score_sum', sa.Integer(), nullable=False),
+        sa.Column('frequency_score_sum', sa.Integer(), nullable=False),
+        sa.Column('monetary_score_sum', sa.Integer(), nullable=False),
+        sa.Column('recency_score_avg', sa.Float(), nullable=False),
+        sa.Column('frequency_score_avg', sa.Float(), nullable=False),
+        sa.Column('monetary_score_avg', sa.Float(), nullable=False),
+        sa.Column('recency_value_avg', sa.Float(), nullable=False),
+        sa.Column('frequency_value_avg', sa.Float(), nullable=False),
+        sa.Column('monetary_value_sum', sa.Float(), nullable=False),
+        sa.Column('monetary_value_avg', sa.Float(), nullable=False),
+        sa.Column('churn_probability_avg', sa.Float(), nullable=True),
+        sa.Column('predicted_ltv_sum', sa.Float(), nullable=True),
+        sa.Column('predicted_ltv_avg', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('analysis_id', 'segment', name='uq_summary_analysis_segment'),
+    )
+
+    # Backfill existing analyses from their customer records
+    op.execute("""
+        INSERT INTO segment_summaries (
+            id, analysis_id, segment, customer_count,
+            recency_score_sum, frequency_score_sum, monetary_score_sum,
+            recency_score_avg, frequency_score_avg, monetary_score_avg,
+            recency_value_avg, frequency_value_avg, monetary_value_sum, monetary_value_avg,
+            created_at
+        )
+        SELECT
+            md5(analysis_id || segment)::uuid::text, analysis_id, segment, COUNT(*),
+            SUM(recency_score), SUM(frequency_score), SUM(monetary_score),
+            AVG(recency_score), AVG(frequency_score), AVG(monetary_score),
+            AVG(recency_value), AVG(frequency_value), SUM(monetary_value), AVG(monetary_value),
+            now()
+        FROM customer_records
+        GROUP BY analysis_id, segment
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('segment_summaries')
@@ -16,13 +16,16 @@ import uvicorn
 # Add current directory to path
 #sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))  
+# Routes and controllers import each other as top-level packages (controllers.*, models.*),
+# so shared modules such as controllers.monitoring are loaded once under that name
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "src")))
 
 # Import routers and middleware
 from src.routes.rfm_api import router as rfm_router
 from src.routes.auth_routes import router as auth_router
 from src.routes.marketplace import router as marketplace_router
-from src.controllers.middleware import RateLimiter, RequestValidator
-from src.controllers.monitoring import MonitoringMiddleware
+from src.routes.admin import router as admin_router
+from src.controllers.middleware import RequestPipelineMiddleware
 from src.models.api_utils import get_api_prefix
 
 # Create FastAPI application
@@ -41,20 +44,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add monitoring middleware
-app.add_middleware(MonitoringMiddleware)
-
-# Add rate limiting middleware
-app.add_middleware(RateLimiter)
-
-# Add request validation middleware
-app.add_middleware(RequestValidator)
+# Add monitoring, request validation and rate limiting as one middleware stage
+app.add_middleware(RequestPipelineMiddleware)
 
 # Include routers with API prefix
 api_prefix = get_api_prefix()
 app.include_router(auth_router, prefix=f"{api_prefix}/auth", tags=["Authentication"])
 app.include_router(rfm_router, prefix=f"{api_prefix}/rfm", tags=["RFM Analysis"])
 app.include_router(marketplace_router, prefix=f"{api_prefix}/marketplace", tags=["Marketplace"])
+app.include_router(admin_router, prefix=f"{api_prefix}/admin", tags=["Admin"])
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
@@ -0,0 +1,97 @@
+# RFM Insights - Analysis History Store
+
+import json
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+class AnalysisHistoryStore:
+    """
+    Append-only analysis history backed by a SQLite file
+    Entries are indexed by user and timestamp, so listing the most recent
+    entries of a user costs O(limit) no matter how much history exists
+    """
+    def __init__(self, db_path: str):
+        """
+        Initialize the history store, creating the schema if needed
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        with self._connect() as conn:
+            # WAL lets several workers append while others read
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_history ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT NOT NULL,"
+                " timestamp TEXT NOT NULL,"
+                " entry TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_user_timestamp "
+                "ON analysis_history (user_id, timestamp DESC, id DESC)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a short-lived connection, committing on success (connections are not shared between threads)"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, user_id: str, entry: Dict[str, Any]) -> None:
+        """
+        Append a history entry for a user
+
+        Args:
+            user_id: ID of the user who ran the analysis
+            entry: History entry; its ISO "timestamp" field is used as the sort key
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO analysis_history (user_id, timestamp, entry) VALUES (?, ?, ?)",
+                (user_id, entry["timestamp"], json.dumps(entry))
+            )
+
+    def list(self, user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List a user's history entries, newest first, using keyset pagination
+
+        Args:
+            user_id: ID of the user
+            limit: Maximum number of entries to return
+            cursor: Cursor returned by a previous call, to fetch the next page
+
+        Returns:
+            Tuple of (entries, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = "SELECT id, timestamp, entry FROM analysis_history WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if cursor:
+            timestamp, _, last_id = cursor.rpartition("|")
+            if not timestamp or not last_id.isdigit():
+                raise ValueError("Invalid history cursor")
+            query += " AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+            params.extend([timestamp, timestamp, int(last_id)])
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        # Fetch one extra row to know whether another page exists
+        params.append(limit + 1)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_id, last_timestamp, _ = rows[-1]
+            next_cursor = f"{last_timestamp}|{last_id}"
+
+        return [json.loads(entry) for _, _, entry in rows], next_cursor
@@ -1,25 +1,81 @@
 # RFM Insights - Middleware Module
 
-from fastapi import Request, HTTPException, status
-from typing import Dict, List, Callable, Optional
-import time
+from fastapi import HTTPException, status
+from typing import Dict, Callable, Optional
+import re
+import json
 import logging
-from collections import defaultdict
+
+from config import config
+from models.api_utils import get_api_prefix
+from .rate_limit import RateLimitBackend, create_rate_limit_backend
+# Absolute import: the same module instance the routes and models use (one sampler, one set of metrics)
+from controllers.monitoring import MonitoringMiddleware
 
 # Setup logger
 logger = logging.getLogger('app.middleware')
 
+# Rate limited authentication endpoints (path prefixes), compiled into a single pattern
+# The auth router is mounted under the versioned API prefix (see main.py)
+AUTH_ENDPOINTS = tuple(
+    f"{get_api_prefix()}/auth/{endpoint}"
+    for endpoint in ("token", "register", "password-reset")
+)
+_AUTH_ENDPOINT_PATTERN = re.compile("|".join(re.escape(endpoint) for endpoint in AUTH_ENDPOINTS))
+
+def is_auth_endpoint(path: str) -> bool:
+    """
+    Check if the path is an authentication endpoint
+    
+    Args:
+        path: Request path
+    """
+    return _AUTH_ENDPOINT_PATTERN.match(path) is not None
+
+def scope_headers(scope) -> Dict[bytes, bytes]:
+    """
+    Read request headers straight from the ASGI scope, without building a Request
+    
+    Args:
+        scope: ASGI connection scope
+        
+    Returns:
+        Headers keyed by lowercase name
+    """
+    return dict(scope.get("headers") or ())
+
+def get_client_ip(scope, headers: Dict[bytes, bytes]) -> str:
+    """
+    Get client IP address from request headers or connection info
+    
+    Args:
+        scope: ASGI connection scope
+        headers: Headers from scope_headers
+    """
+    # Try to get IP from X-Forwarded-For header (when behind proxy/load balancer)
+    forwarded_for = headers.get(b"x-forwarded-for")
+    if forwarded_for:
+        # Get the first IP in the chain
+        return forwarded_for.split(b",")[0].strip().decode("latin-1")
+    
+    # Fallback to direct client IP
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
 # Rate limiting middleware for authentication endpoints
 class RateLimiter:
     """
     Rate limiting middleware to prevent brute force attacks
-    Tracks requests by IP address and blocks excessive requests
+    Tracks requests by IP address with a token bucket per IP and blocks excessive requests.
+    Bucket state lives in a pluggable backend: per process (memory), shared by the
+    workers of a host (shared) or shared by every replica (redis).
     """
     def __init__(self, 
                  app,
                  rate_limit: int = 5, 
                  time_window: int = 60,
-                 block_time: int = 300):
+                 block_time: int = 300,
+                 backend: Optional[RateLimitBackend] = None):
         """
         Initialize rate limiter
         
@@ -28,13 +84,21 @@ class RateLimiter:
             rate_limit: Maximum number of requests allowed in the time window
             time_window: Time window in seconds
             block_time: Time to block in seconds after exceeding rate limit
+            backend: Rate limit state storage; built from RATE_LIMIT_* settings when None
         """
         self.app = app
         self.rate_limit = rate_limit
         self.time_window = time_window
         self.block_time = block_time
-        self.requests: Dict[str, List[float]] = defaultdict(list)
-        self.blocked_ips: Dict[str, float] = {}
+        if backend is None:
+            backend = create_rate_limit_backend(
+                config.RATE_LIMIT_BACKEND,
+                rate_limit,
+                time_window,
+                block_time,
+                **config.RATE_LIMIT_BACKEND_OPTIONS.get(config.RATE_LIMIT_BACKEND, {})
+            )
+        self.backend = backend
         
     async def __call__(self, scope, receive, send):
         """
@@ -45,216 +109,92 @@ class RateLimiter:
             receive: ASGI receive function
             send: ASGI send function
         """
-        if scope["type"] != "http":
+        # Only apply rate limiting to authentication endpoints
+        if scope["type"] != "http" or not is_auth_endpoint(scope["path"]):
             return await self.app(scope, receive, send)
-            
-        # Create request object
-        request = Request(scope=scope, receive=receive)
         
-        # Define a send wrapper to intercept the response
-        async def send_wrapper(message):
-            await send(message)
-            
-        # Process the request with rate limiting
-        try:
-            # Get client IP
-            client_ip = self._get_client_ip(request)
-            path = request.url.path
-            
-            # Only apply rate limiting to authentication endpoints
-            if not self._is_auth_endpoint(path):
-                return await self.app(scope, receive, send)
-            
-            # Check if IP is blocked
-            if client_ip in self.blocked_ips:
-                block_time = self.blocked_ips[client_ip]
-                current_time = time.time()
-                
-                # If block time has expired, remove from blocked list
-                if current_time > block_time:
-                    del self.blocked_ips[client_ip]
-                    logger.info(f"Unblocked IP {client_ip} after timeout period")
-                else:
-                    # Calculate remaining block time
-                    remaining = int(block_time - current_time)
-                    logger.warning(f"Blocked request from {client_ip} to {path} (remaining block time: {remaining}s)")
-                    
-                    # Create HTTP exception
-                    exc = HTTPException(
-                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                        detail=f"Too many requests. Please try again in {remaining} seconds."
-                    )
-                    
-                    # Return error response
-                    from starlette.responses import JSONResponse
-                    response = JSONResponse(
-                        status_code=exc.status_code,
-                        content={"detail": exc.detail}
-                    )
-                    
-                    await send({
-                        "type": "http.response.start",
-                        "status": exc.status_code,
-                        "headers": [
-                            (b"content-type", b"application/json")
-                        ]
-                    })
-                    
-                    await send({
-                        "type": "http.response.body",
-                        "body": response.body
-                    })
-                    
-                    return
-            
-            # Clean up old requests
-            self._cleanup_old_requests(client_ip)
-            
-            # Check rate limit
-            if len(self.requests[client_ip]) >= self.rate_limit:
-                # Block the IP
-                self.blocked_ips[client_ip] = time.time() + self.block_time
-                logger.warning(f"Blocked IP {client_ip} for {self.block_time} seconds due to rate limit exceeded")
-                
-                # Create HTTP exception
-                exc = HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Rate limit exceeded. Please try again later."
-                )
-                
-                # Return error response
-                from starlette.responses import JSONResponse
-                response = JSONResponse(
-                    status_code=exc.status_code,
-                    content={"detail": exc.detail}
-                )
-                
-                await send({
-                    "type": "http.response.start",
-                    "status": exc.status_code,
-                    "headers": [
-                        (b"content-type", b"application/json")
-                    ]
-                })
-                
-                await send({
-                    "type": "http.response.body",
-                    "body": response.body
-                })
-                
-                return
-            
-            # Add current request timestamp
-            self.requests[client_ip].append(time.time())
-            
+        if await self.allow(scope, scope_headers(scope), send):
             # Process the request
             return await self.app(scope, receive, send)
-        except:
-            print("An exception occurred")
-        # Get client IP
-        client_ip = self._get_client_ip(request)
-        path = request.url.path
-        
-        # Only apply rate limiting to authentication endpoints
-        if not self._is_auth_endpoint(path):
-            return await call_next(request) # type: ignore
-        
-        # Check if IP is blocked
-        if client_ip in self.blocked_ips:
-            block_time = self.blocked_ips[client_ip]
-            current_time = time.time()
-            
-            # If block time has expired, remove from blocked list
-            if current_time > block_time:
-                del self.blocked_ips[client_ip]
-                logger.info(f"Unblocked IP {client_ip} after timeout period")
-            else:
-                # Calculate remaining block time
-                remaining = int(block_time - current_time)
-                logger.warning(f"Blocked request from {client_ip} to {path} (remaining block time: {remaining}s)")
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Too many requests. Please try again in {remaining} seconds."
-                )
-        
-        # Clean up old requests
-        self._cleanup_old_requests(client_ip)
-        
-        # Check rate limit
-        if len(self.requests[client_ip]) >= self.rate_limit:
-            # Block the IP
-            self.blocked_ips[client_ip] = time.time() + self.block_time
-            logger.warning(f"Blocked IP {client_ip} for {self.block_time} seconds due to rate limit exceeded")
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded. Please try again later."
-            )
-        
-        # Add current request timestamp
-        self.requests[client_ip].append(time.time())
-        
-        # Process the request
-        return await call_next(request) # type: ignore
     
-    def _get_client_ip(self, request: Request) -> str:
+    async def allow(self, scope, headers: Dict[bytes, bytes], send) -> bool:
         """
-        Get client IP address from request headers or connection info
+        Count a request against its client IP, sending a 429 response if it is blocked
         
         Args:
-            request: FastAPI request object
+            scope: ASGI connection scope
+            headers: Headers from scope_headers
+            send: ASGI send function
+            
+        Returns:
+            True if the request may proceed
         """
-        # Try to get IP from X-Forwarded-For header (when behind proxy/load balancer)
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            # Get the first IP in the chain
-            return forwarded_for.split(",")[0].strip()
-        
-        # Fallback to direct client IP
-        return request.client.host if request.client else "unknown"
+        client_ip = get_client_ip(scope, headers)
+        retry_after = await self.backend.hit(client_ip)
+        if retry_after is None:
+            return True
+        logger.warning(f"Blocked request from {client_ip} to {scope['path']} (remaining block time: {retry_after}s)")
+        await self._reject(send, retry_after)
+        return False
     
-    def _cleanup_old_requests(self, client_ip: str) -> None:
+    async def _reject(self, send, retry_after: int) -> None:
         """
-        Remove requests older than the time window
+        Send a 429 response
         
         Args:
-            client_ip: Client IP address
+            send: ASGI send function
+            retry_after: Seconds until the client may retry
         """
-        if client_ip in self.requests:
-            current_time = time.time()
-            self.requests[client_ip] = [
-                timestamp for timestamp in self.requests[client_ip]
-                if current_time - timestamp < self.time_window
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_429_TOO_MANY_REQUESTS,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(retry_after).encode())
             ]
-    
-    def _is_auth_endpoint(self, path: str) -> bool:
-        """
-        Check if the path is an authentication endpoint
+        })
         
-        Args:
-            path: Request path
-        """
-        auth_endpoints = [
-            "/api/auth/token",
-            "/api/auth/register",
-            "/api/auth/password-reset"
-        ]
-        return any(path.startswith(endpoint) for endpoint in auth_endpoints)
+        await send({
+            "type": "http.response.body",
+            "body": json.dumps({"detail": f"Too many requests. Please try again in {retry_after} seconds."}).encode()
+        })
 
 
 # Input validation middleware
+class RequestBodyTooLarge(HTTPException):
+    """Raised from the wrapped receive function once a request body exceeds its limit"""
+    def __init__(self, limit: int):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Request body too large (limit: {limit} bytes)"
+        )
+
 class RequestValidator:
     """
     Middleware for additional request validation
-    Performs basic sanity checks on incoming requests
+    Performs basic sanity checks on incoming requests and bounds request bodies.
+    The declared content-length is checked up front; the body is also counted as it
+    streams in, so chunked and multipart uploads are cut off at the same limit.
     """
-    def __init__(self, app):
+    def __init__(self, app, max_body_size: Optional[int] = None, route_limits: Optional[Dict[str, int]] = None):
         """
         Initialize request validator
         
         Args:
             app: FastAPI application
+            max_body_size: Default body limit in bytes; REQUEST_BODY_MAX_BYTES when None
+            route_limits: Body limits for full path prefixes; REQUEST_BODY_ROUTE_LIMITS
+                (relative to the API prefix) when None
         """
         self.app = app
+        self.max_body_size = config.REQUEST_BODY_MAX_BYTES if max_body_size is None else max_body_size
+        if route_limits is None:
+            route_limits = {
+                f"{get_api_prefix()}{path}": limit
+                for path, limit in config.REQUEST_BODY_ROUTE_LIMITS.items()
+            }
+        # Longest prefix first, so the most specific route wins
+        self.route_limits = sorted(route_limits.items(), key=lambda item: len(item[0]), reverse=True)
         
     async def __call__(self, scope, receive, send):
         """
@@ -267,30 +207,103 @@ class RequestValidator:
         """
         if scope["type"] != "http":
             return await self.app(scope, receive, send)
-            
-        # Create request object
-        request = Request(scope=scope, receive=receive)
-        
-        # Get request content type
-        content_type = request.headers.get("content-type", "")
-        
-        # For JSON requests, validate content length
-        if "application/json" in content_type:
-            content_length = request.headers.get("content-length", "0")
-            try:
-                if int(content_length) > 10 * 1024 * 1024:  # 10MB limit
-                    # Create HTTP exception
-                    exc = HTTPException(
-                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        detail="Request body too large"
-                    )
-                    # Return error response
-                    return await self._handle_error(exc, send)
-            except ValueError:
-                pass
+        
+        limit = self.body_limit(scope["path"])
+        exc = self.validate(scope_headers(scope), limit)
+        if exc is not None:
+            # Return error response
+            return await self._handle_error(exc, send)
         
         # Process the request
-        return await self.app(scope, receive, send)
+        return await self.forward(self.app, scope, receive, send, limit)
+    
+    def body_limit(self, path: str) -> int:
+        """
+        Get the body limit of a route
+        
+        Args:
+            path: Request path
+            
+        Returns:
+            Maximum body size in bytes
+        """
+        for prefix, limit in self.route_limits:
+            if path.startswith(prefix):
+                return limit
+        return self.max_body_size
+    
+    def validate(self, headers: Dict[bytes, bytes], limit: Optional[int] = None) -> Optional[HTTPException]:
+        """
+        Run sanity checks on request headers
+        
+        Args:
+            headers: Headers from scope_headers
+            limit: Body limit in bytes; the default limit when None
+            
+        Returns:
+            HTTPException to send back, or None if the request is valid
+        """
+        if limit is None:
+            limit = self.max_body_size
+        # Reject bodies declared too large before reading any of them
+        try:
+            if int(headers.get(b"content-length", b"0")) > limit:
+                return RequestBodyTooLarge(limit)
+        except ValueError:
+            pass
+        return None
+    
+    def limit_body(self, receive: Callable, limit: int) -> Callable:
+        """
+        Wrap an ASGI receive function to count body bytes as they arrive
+        
+        Args:
+            receive: ASGI receive function
+            limit: Body limit in bytes
+            
+        Returns:
+            Receive function raising RequestBodyTooLarge once the limit is exceeded
+        """
+        received = 0
+        
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise RequestBodyTooLarge(limit)
+            return message
+        
+        return receive_limited
+    
+    async def forward(self, app, scope, receive, send, limit: int) -> None:
+        """
+        Pass a request on with its body bounded, answering 413 if it grows past the limit
+        
+        Args:
+            app: Next ASGI application
+            scope: ASGI connection scope
+            receive: ASGI receive function
+            send: ASGI send function
+            limit: Body limit in bytes
+        """
+        response_started = False
+        
+        async def send_tracked(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+        
+        try:
+            await app(scope, self.limit_body(receive, limit), send_tracked)
+        except RequestBodyTooLarge as exc:
+            # FastAPI normally renders the exception itself; answer here if it did not
+            if response_started:
+                raise
+            logger.warning(f"Request body to {scope['path']} exceeded {limit} bytes")
+            await self._handle_error(exc, send)
         
     async def _handle_error(self, exc: HTTPException, send):
         """
@@ -300,14 +313,6 @@ class RequestValidator:
             exc: HTTPException to handle
             send: ASGI send function
         """
-        from starlette.responses import JSONResponse
-        
-        # Create JSON response from exception
-        response = JSONResponse(
-            status_code=exc.status_code,
-            content={"detail": exc.detail}
-        )
-        
         # Send response headers
         await send({
             "type": "http.response.start",
@@ -320,7 +325,57 @@ class RequestValidator:
         # Send response body
         await send({
             "type": "http.response.body",
-            "body": response.body
+            "body": json.dumps({"detail": exc.detail}).encode()
         })
         
-        return
\ No newline at end of file
+        return
+
+
+# Combined middleware stage
+class RequestPipelineMiddleware:
+    """
+    Runs monitoring, request validation and rate limiting as a single ASGI stage
+    The path is classified once, headers are read once from the scope, and no
+    Request object is built, instead of each middleware repeating that work
+    """
+    def __init__(self, app, rate_limiter: Optional[RateLimiter] = None):
+        """
+        Initialize request pipeline
+        
+        Args:
+            app: FastAPI application
+            rate_limiter: Rate limiter for authentication endpoints; a default one is built when None
+        """
+        self.app = app
+        self.monitor = MonitoringMiddleware(app)
+        self.validator = RequestValidator(app)
+        self.rate_limiter = rate_limiter or RateLimiter(app)
+        
+    async def __call__(self, scope, receive, send):
+        """
+        ASGI middleware implementation
+        
+        Args:
+            scope: ASGI connection scope
+            receive: ASGI receive function
+            send: ASGI send function
+        """
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        # Rejected requests are measured too
+        await self.monitor.observe(scope, receive, send, self._handle)
+    
+    async def _handle(self, scope, receive, send):
+        """Validate and rate limit the request, then pass it on"""
+        headers = scope_headers(scope)
+        limit = self.validator.body_limit(scope["path"])
+        
+        exc = self.validator.validate(headers, limit)
+        if exc is not None:
+            return await self.validator._handle_error(exc, send)
+        
+        if is_auth_endpoint(scope["path"]) and not await self.rate_limiter.allow(scope, headers, send):
+            return
+        
+        await self.validator.forward(self.app, scope, receive, send, limit)
@@ -1,10 +1,18 @@
 # RFM Insights - Monitoring Module
 
 import time
+import asyncio
 import logging
 import functools
 import os
-from typing import Dict, Any, Optional, Callable
+import queue
+import threading
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Optional, Callable
 from uuid import uuid4
 
 # Import monitoring configuration
@@ -21,36 +29,66 @@ from config.monitoring_config import (
     ALERT_EMAIL_RECIPIENTS,
     ALERT_SLACK_WEBHOOK,
     ALERT_CRITICAL_THRESHOLD,
+    ALERT_QUEUE_SIZE,
+    ALERT_DEDUP_SECONDS,
+    ALERT_DIGEST_INTERVAL,
+    ALERT_HTTP_TIMEOUT,
+    RESOURCE_SAMPLE_INTERVAL,
+    ANALYSIS_TRACK_MEMORY,
+    N_PLUS_ONE_THRESHOLD,
     LOGGING_CONTEXT_FIELDS
 )
 
+from backend.utils.query_stats import StatementInfo, query_stats
+
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 # Initialize context for request tracking
+# The current request's context is an immutable mapping held in a context variable:
+# each asyncio task (i.e. each request) sees its own value, and updates replace the
+# mapping instead of mutating it, so snapshots can be taken without copying or locks
+_request_context: ContextVar[Mapping[str, Any]] = ContextVar("request_context", default=MappingProxyType({}))
+
 class RequestContext:
     """Store context information for the current request"""
-    _context = {}
 
     @classmethod
     def set(cls, key: str, value: Any) -> None:
         """Set a context value"""
-        cls._context[key] = value
+        context = dict(_request_context.get())
+        context[key] = value
+        _request_context.set(MappingProxyType(context))
 
     @classmethod
     def get(cls, key: str, default: Any = None) -> Any:
         """Get a context value"""
-        return cls._context.get(key, default)
+        return _request_context.get().get(key, default)
 
     @classmethod
     def get_all(cls) -> Dict[str, Any]:
         """Get all context values"""
-        return cls._context.copy()
+        return dict(_request_context.get())
+
+    @classmethod
+    def snapshot(cls) -> Mapping[str, Any]:
+        """Get a read-only view of the context; it never changes after being taken"""
+        return _request_context.get()
+
+    @classmethod
+    def start(cls, **values: Any) -> Token:
+        """Start a fresh context for a request, returning a token for reset"""
+        return _request_context.set(MappingProxyType(values))
+
+    @classmethod
+    def reset(cls, token: Token) -> None:
+        """Restore the context that was current before start"""
+        _request_context.reset(token)
 
     @classmethod
     def clear(cls) -> None:
-        """Clear all context values"""
-        cls._context.clear()
+        """Clear all context values of the current request"""
+        _request_context.set(MappingProxyType({}))
 
     @classmethod
     def generate_request_id(cls) -> str:
@@ -59,6 +97,46 @@ class RequestContext:
         cls.set('request_id', request_id)
         return request_id
 
+    @classmethod
+    def bind(cls, func: Callable) -> "ContextBoundCall":
+        """
+        Bind a function to the current context before handing it to a thread or process pool
+
+        Executors do not carry context variables over to their workers; the bound
+        call restores a snapshot of the context around the function instead.
+        It can be pickled for process pools when the function itself can be.
+        """
+        return ContextBoundCall(func, dict(_request_context.get()))
+
+class ContextBoundCall:
+    """Callable running a function inside a captured request context"""
+    def __init__(self, func: Callable, context: Dict[str, Any]):
+        self.func = func
+        self.context = context
+
+    def __call__(self, *args, **kwargs):
+        token = RequestContext.start(**self.context)
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            RequestContext.reset(token)
+
+class RequestContextFilter(logging.Filter):
+    """Logging filter adding the request context fields to log records"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request_context.get()
+        for field in LOGGING_CONTEXT_FIELDS:
+            # Values passed explicitly with extra take precedence
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+def install_request_context_logging(logger_name: str = None) -> None:
+    """Add the request context filter to the handlers of a logger (the root logger by default)"""
+    for handler in logging.getLogger(logger_name).handlers:
+        if not any(isinstance(f, RequestContextFilter) for f in handler.filters):
+            handler.addFilter(RequestContextFilter())
+
 # Initialize Prometheus metrics if enabled
 if PROMETHEUS_ENABLE:
     try:
@@ -168,7 +246,7 @@ if SENTRY_DSN:
                 # Add request context to Sentry scope
                 with sentry_sdk.push_scope() as scope:
                     # Add request context
-                    request_context = RequestContext.get_all()
+                    request_context = RequestContext.snapshot()
                     for key, value in request_context.items():
                         scope.set_tag(key, value)
                     
@@ -186,8 +264,162 @@ if SENTRY_DSN:
         logger.warning("Sentry SDK not installed. Exception tracking disabled.")
 
 # Alert functions
+ALERT_LEVELS = {"warning": 0, "error": 1, "critical": 2}
+# Context fields identifying what an alert is about, used to build its deduplication key
+ALERT_KEY_FIELDS = ("method", "endpoint", "function")
+
+def alert_key(message: str, level: str, context: Dict[str, Any] = None) -> str:
+    """
+    Build the deduplication key of an alert
+    
+    Messages carry measured values after the first colon ("... exceeded: GET /x took 1.2s"),
+    so the key uses the text before it plus the identifying context fields
+    """
+    parts = [level, message.split(":", 1)[0]]
+    if context:
+        parts.extend(str(context[field]) for field in ALERT_KEY_FIELDS if field in context)
+    return "|".join(parts)
+
+class AlertDispatcher:
+    """
+    Delivers alerts to email and Slack from a background thread
+    Callers only enqueue, so a slow or unreachable webhook never adds latency to
+    requests. The worker collects alerts into periodic digests, sends each key at
+    most once per deduplication interval (counting the repeats it suppressed) and,
+    when the queue fills up, drops warnings first.
+    """
+    def __init__(self, max_queue: int = 1000, dedup_seconds: float = 300,
+                 digest_interval: float = 30, max_keys: int = 10000):
+        """
+        Args:
+            max_queue: Maximum number of pending alerts
+            dedup_seconds: Minimum interval between deliveries of the same alert key
+            digest_interval: Seconds alerts are collected before a digest is sent
+            max_keys: Maximum number of alert keys remembered for deduplication
+        """
+        self.max_queue = max_queue
+        self.dedup_seconds = dedup_seconds
+        self.digest_interval = digest_interval
+        self.max_keys = max_keys
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        # Alert key -> [last delivery time, repeats suppressed since], least recently sent first
+        self._sent: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    def submit(self, message: str, level: str, context: Dict[str, Any] = None) -> bool:
+        """
+        Queue an alert for delivery without blocking
+        
+        Returns:
+            False if the alert was dropped because the queue is under pressure
+        """
+        self._ensure_worker()
+        # Keep the second half of the queue for errors and critical alerts
+        if level == "warning" and self._queue.qsize() >= self.max_queue // 2:
+            self._count_dropped()
+            return False
+        try:
+            self._queue.put_nowait((alert_key(message, level, context), message, level, context))
+        except queue.Full:
+            self._count_dropped()
+            return False
+        return True
+    
+    def _count_dropped(self) -> None:
+        """Count a dropped alert (submit runs on any thread)"""
+        with self._lock:
+            self.dropped += 1
+    
+    def _ensure_worker(self) -> None:
+        """Start the worker thread on first use (and again in forked worker processes)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                self._thread.start()
+    
+    def _run(self) -> None:
+        """Worker loop: collect alerts for one digest interval, then deliver them"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.digest_interval
+            # Critical alerts are delivered without waiting for the digest interval
+            while batch[-1][2] != "critical":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                logger.error(f"Failed to deliver alerts: {str(e)}")
+    
+    def _deliver(self, batch: List[tuple]) -> None:
+        """Group a batch by alert key, drop keys sent recently and send the rest as one digest"""
+        groups: "OrderedDict[str, List]" = OrderedDict()
+        for key, message, level, context in batch:
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [message, level, context, 1]
+            else:
+                group[0], group[2] = message, context
+                group[3] += 1
+        
+        now = time.monotonic()
+        entries = []
+        for key, (message, level, context, count) in groups.items():
+            sent = self._sent.get(key)
+            if sent is not None and now - sent[0] < self.dedup_seconds:
+                sent[1] += count
+                continue
+            if sent is not None:
+                count += int(sent[1])
+            self._sent[key] = [now, 0]
+            self._sent.move_to_end(key)
+            entries.append((message, level, context, count))
+        while len(self._sent) > self.max_keys:
+            self._sent.popitem(last=False)
+        
+        if not entries:
+            return
+        if len(entries) == 1:
+            message, level, context, count = entries[0]
+            if count > 1:
+                message = f"{message} (x{count})"
+        else:
+            level = max((entry[1] for entry in entries), key=lambda name: ALERT_LEVELS.get(name, 0))
+            message = f"{len(entries)} alerts:\n" + "\n".join(
+                f"[{entry[1].upper()}] {entry[0]}" + (f" (x{entry[3]})" if entry[3] > 1 else "")
+                for entry in entries
+            )
+            context = None
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            message = f"{message}\n({dropped} alerts dropped under load)"
+        
+        # Send email alert if recipients are configured
+        if ALERT_EMAIL_RECIPIENTS and any(ALERT_EMAIL_RECIPIENTS):
+            _send_email_alert(message, level, context)
+        
+        # Send Slack alert if webhook is configured
+        if ALERT_SLACK_WEBHOOK:
+            _send_slack_alert(message, level, context)
+
+alert_dispatcher = AlertDispatcher(
+    max_queue=ALERT_QUEUE_SIZE,
+    dedup_seconds=ALERT_DEDUP_SECONDS,
+    digest_interval=ALERT_DIGEST_INTERVAL
+)
+
 def send_alert(message: str, level: str = "warning", context: Dict[str, Any] = None) -> None:
-    """Send an alert via configured channels"""
+    """Log an alert and queue it for delivery via configured channels"""
     try:
         # Log the alert
         if level == "critical":
@@ -197,13 +429,9 @@ def send_alert(message: str, level: str = "warning", context: Dict[str, Any] = N
         else:
             logger.warning(message, extra={"alert": True, "context": context})
         
-        # Send email alert if recipients are configured
-        if ALERT_EMAIL_RECIPIENTS and any(ALERT_EMAIL_RECIPIENTS):
-            _send_email_alert(message, level, context)
-        
-        # Send Slack alert if webhook is configured
-        if ALERT_SLACK_WEBHOOK:
-            _send_slack_alert(message, level, context)
+        # Email and Slack delivery happens on the dispatcher thread
+        if (ALERT_EMAIL_RECIPIENTS and any(ALERT_EMAIL_RECIPIENTS)) or ALERT_SLACK_WEBHOOK:
+            alert_dispatcher.submit(message, level, context)
     
     except Exception as e:
         logger.error(f"Failed to send alert: {str(e)}")
@@ -242,7 +470,7 @@ def _send_slack_alert(message: str, level: str, context: Dict[str, Any] = None)
                 })
         
         # Send the request to Slack webhook
-        response = requests.post(ALERT_SLACK_WEBHOOK, json=payload)
+        response = requests.post(ALERT_SLACK_WEBHOOK, json=payload, timeout=ALERT_HTTP_TIMEOUT)
         response.raise_for_status()
     
     except ImportError:
@@ -324,6 +552,108 @@ def monitor_performance(func_name: str = None, threshold: float = None, metric_n
     
     return decorator
 
+# Pipeline stage timing
+def dataset_size_bucket(rows: int) -> str:
+    """Get the dataset_size label of a row count (bounded set of values)"""
+    for limit, label in ((1000, "<1k"), (10000, "1k-10k"), (100000, "10k-100k"), (1000000, "100k-1M")):
+        if rows < limit:
+            return label
+    return ">=1M"
+
+class StageTimer:
+    """
+    Times the stages of one analysis run and records their peak memory
+    Stages are recorded in order; observe exports them to the
+    rfm_analysis_duration_seconds and rfm_analysis_peak_memory_bytes histograms,
+    with the stage name as analysis_type and the total under "total".
+    Peak memory comes from tracemalloc, so it counts Python and NumPy allocations
+    of the whole process while the stage runs; with concurrent analyses the
+    peaks overlap and are only indicative. It is off unless ANALYSIS_TRACK_MEMORY
+    is set, since tracing slows down every allocation in the process.
+    """
+    _tracing_runs = 0
+    _tracing_lock = threading.Lock()
+    
+    def __init__(self, track_memory: bool = ANALYSIS_TRACK_MEMORY):
+        """
+        Args:
+            track_memory: Measure peak memory per stage (starts tracemalloc for the run)
+        """
+        self.track_memory = track_memory
+        self.dataset_size: Optional[int] = None
+        # Stage name -> {"duration": seconds, "peak_memory": bytes or None}
+        self.stages: "OrderedDict[str, Dict[str, Optional[float]]]" = OrderedDict()
+        self._start = time.perf_counter()
+        self._end: Optional[float] = None
+        self._owns_tracing = False
+        if track_memory:
+            with StageTimer._tracing_lock:
+                if StageTimer._tracing_runs or not tracemalloc.is_tracing():
+                    if not tracemalloc.is_tracing():
+                        tracemalloc.start()
+                    StageTimer._tracing_runs += 1
+                    self._owns_tracing = True
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block as one stage"""
+        tracing = self.track_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline if tracing else None
+            self.stages[name] = {"duration": duration, "peak_memory": peak}
+    
+    def total(self) -> float:
+        """Seconds from creating the timer until finish (or now)"""
+        return (self._end or time.perf_counter()) - self._start
+    
+    def finish(self) -> None:
+        """End the run, stopping memory tracking started for it"""
+        if self._end is None:
+            self._end = time.perf_counter()
+        if self._owns_tracing:
+            self._owns_tracing = False
+            with StageTimer._tracing_lock:
+                StageTimer._tracing_runs -= 1
+                if StageTimer._tracing_runs == 0:
+                    tracemalloc.stop()
+    
+    def observe(self) -> None:
+        """Finish the run and export stage durations and peak memory"""
+        self.finish()
+        total = self.total()
+        if not PROMETHEUS_ENABLE:
+            return
+        size = dataset_size_bucket(self.dataset_size or 0)
+        peaks = []
+        for name, timing in self.stages.items():
+            labels = {"dataset_size": size, "analysis_type": name}
+            observe_histogram("rfm_analysis_duration_seconds", timing["duration"], labels)
+            if timing["peak_memory"] is not None:
+                observe_histogram("rfm_analysis_peak_memory_bytes", timing["peak_memory"], labels)
+                peaks.append(timing["peak_memory"])
+        labels = {"dataset_size": size, "analysis_type": "total"}
+        observe_histogram("rfm_analysis_duration_seconds", total, labels)
+        if peaks:
+            observe_histogram("rfm_analysis_peak_memory_bytes", max(peaks), labels)
+    
+    def server_timing(self) -> str:
+        """Format the stages as a Server-Timing header value"""
+        entries = []
+        for name, timing in self.stages.items():
+            entry = f"{name};dur={timing['duration'] * 1000:.1f}"
+            if timing["peak_memory"] is not None:
+                entry += f';desc="peak {timing["peak_memory"] / (1024 * 1024):.1f}MB"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(entries)
+
 # Database query monitoring
 def monitor_database_query(query_type: str, table: str = None):
     """Decorator to monitor database query performance"""
@@ -387,6 +717,92 @@ def monitor_database_query(query_type: str, table: str = None):
     
     return decorator
 
+def _observe_statement(engine: str, info: StatementInfo, duration: float) -> None:
+    """Record a statement timed by the engine instrumentation"""
+    if PROMETHEUS_ENABLE:
+        observe_histogram(
+            "database_query_duration_seconds",
+            duration,
+            {"query_type": info.query_type, "table": info.table}
+        )
+        observe_histogram(
+            "database_statement_duration_seconds",
+            duration,
+            {"engine": engine, "fingerprint": info.fingerprint}
+        )
+
+query_stats.add_observer(_observe_statement)
+
+def _report_repeated_statements(counts, method: str, endpoint: str) -> None:
+    """Flag SELECTs a request ran often enough to be a likely N+1 query"""
+    repeated = [
+        (info, count) for info, count in counts.items()
+        if count >= N_PLUS_ONE_THRESHOLD and info.query_type == "SELECT"
+    ]
+    if not repeated:
+        return
+    if PROMETHEUS_ENABLE:
+        increment_counter("database_n_plus_one_total", {"endpoint": endpoint})
+    for info, count in repeated:
+        logger.warning(
+            f"Possible N+1 query in {method} {endpoint}: statement {info.fingerprint} ran {count} times: {info.statement[:200]}",
+            extra={"fingerprint": info.fingerprint, "query_count": count}
+        )
+
+# Endpoint labels for request metrics
+class EndpointLabelResolver:
+    """
+    Map request paths to the route templates that serve them, e.g.
+    /api/v1/marketplace/message/42 -> /api/v1/marketplace/message/{message_id}
+    Paths no route matches share the "other" label, so the number of label values
+    stays bounded by the number of routes.
+    """
+    OTHER = "other"
+    
+    def __init__(self, max_paths: int = 10000):
+        """
+        Args:
+            max_paths: Maximum number of resolved paths kept in the cache
+        """
+        self.max_paths = max_paths
+        # Path -> label, least recently used first
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+    
+    def resolve(self, scope) -> str:
+        """Get the endpoint label of a request"""
+        # FastAPI records the matched route in the scope while routing
+        route = scope.get("route")
+        template = getattr(route, "path_format", None)
+        if template:
+            return template
+        
+        path = scope.get("path", "")
+        label = self._cache.get(path)
+        if label is not None:
+            self._cache.move_to_end(path)
+            return label
+        
+        label = self._match(scope)
+        self._cache[path] = label
+        if len(self._cache) > self.max_paths:
+            self._cache.popitem(last=False)
+        return label
+    
+    def _match(self, scope) -> str:
+        """Find the template of the first route matching the path"""
+        router = getattr(scope.get("app"), "router", None)
+        for route in getattr(router, "routes", ()):
+            try:
+                match, _ = route.matches(scope)
+            except Exception:
+                continue
+            # Partial matches (path matches, method does not) still identify the route
+            if match.value:
+                return getattr(route, "path_format", None) or self.OTHER
+        return self.OTHER
+
+endpoint_labels = EndpointLabelResolver()
+
 # API request monitoring middleware for FastAPI
 class MonitoringMiddleware:
     """Middleware for monitoring API requests"""
@@ -398,16 +814,38 @@ class MonitoringMiddleware:
         if scope["type"] != "http":
             return await self.app(scope, receive, send)
         
-        # Generate request ID
-        request_id = RequestContext.generate_request_id()
-        
+        await self.observe(scope, receive, send, self.app)
+    
+    async def observe(self, scope, receive, send, handler: Callable) -> None:
+        """Run an ASGI handler for an HTTP request, recording its metrics"""
         # Extract request information
         method = scope.get("method", "")
         path = scope.get("path", "")
         
-        # Set request context
-        RequestContext.set("endpoint", path)
-        RequestContext.set("http_method", method)
+        # Sample resources and event loop lag once the server is serving requests
+        if resource_sampler.loop is None:
+            resource_sampler.watch_event_loop(asyncio.get_running_loop())
+            resource_sampler.start()
+        
+        # Start a fresh context for this request; other in-flight requests keep their own
+        context_token = RequestContext.start(
+            request_id=str(uuid4()),
+            endpoint=path,
+            http_method=method
+        )
+        
+        # Count the statements this request runs
+        statements_token = query_stats.start_request()
+        
+        # Capture the status code actually sent to the client
+        status_code = None
+        
+        async def send_tracked(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                RequestContext.set("status_code", status_code)
+            await send(message)
         
         # Start timing
         start_time = time.time()
@@ -415,24 +853,27 @@ class MonitoringMiddleware:
         # Process the request
         try:
             # Call the next middleware or route handler
-            await self.app(scope, receive, send)
+            await handler(scope, receive, send_tracked)
             
             # Calculate response time
             response_time = time.time() - start_time
             
+            # Label by route template rather than raw path, so IDs in paths do not create new series
+            endpoint = endpoint_labels.resolve(scope)
+            
             # Record metrics if Prometheus is enabled
             if PROMETHEUS_ENABLE:
                 # Increment request counter
                 increment_counter(
                     "http_requests_total", 
-                    {"method": method, "endpoint": path, "status": "success"}
+                    {"method": method, "endpoint": endpoint, "status": str(status_code or 500)}
                 )
                 
                 # Record request duration
                 observe_histogram(
                     "http_request_duration_seconds", 
                     response_time, 
-                    {"method": method, "endpoint": path}
+                    {"method": method, "endpoint": endpoint}
                 )
             
             # Check if response time exceeds threshold
@@ -441,18 +882,19 @@ class MonitoringMiddleware:
                 send_alert(
                     f"API response time threshold exceeded: {method} {path} took {response_time:.4f}s (threshold: {threshold}s)",
                     level="warning" if response_time < threshold * 2 else "error",
-                    context={"method": method, "endpoint": path, "response_time": response_time, "threshold": threshold}
+                    context={"method": method, "endpoint": endpoint, "response_time": response_time, "threshold": threshold}
                 )
         
         except Exception as e:
             # Calculate response time even if there's an exception
             response_time = time.time() - start_time
+            endpoint = endpoint_labels.resolve(scope)
             
             # Record metrics for failed request
             if PROMETHEUS_ENABLE:
                 increment_counter(
                     "http_requests_total", 
-                    {"method": method, "endpoint": path, "status": "error"}
+                    {"method": method, "endpoint": endpoint, "status": str(status_code or 500)}
                 )
             
             # Log exception
@@ -470,55 +912,193 @@ class MonitoringMiddleware:
             raise
         
         finally:
-            # Clear request context
-            RequestContext.clear()
+            try:
+                _report_repeated_statements(query_stats.finish_request(statements_token), method, endpoint_labels.resolve(scope))
+            except Exception as e:
+                logger.error(f"Failed to check repeated statements: {str(e)}")
+            
+            # Restore the context from before this request
+            RequestContext.reset(context_token)
 
 # System monitoring functions
-def monitor_system_resources():
-    """Monitor system resources (CPU, memory) and record metrics"""
-    try:
-        import psutil
-        
-        # Get CPU usage
-        cpu_percent = psutil.cpu_percent(interval=1)
+class ResourceSampler:
+    """
+    Samples process and system resources on a background thread
+    Each sample is published to the Prometheus gauges and kept as the latest
+    snapshot, so readers never wait for a measurement (psutil.cpu_percent with an
+    interval sleeps for that long in the calling thread).
+    Besides CPU and memory it tracks open file descriptors, event loop lag, the
+    queue depth of registered thread pools and checkouts of registered DB pools.
+    """
+    def __init__(self, interval: float = 15, service: str = "api"):
+        """
+        Args:
+            interval: Seconds between samples
+            service: Value of the service label
+        """
+        self.interval = interval
+        self.service = service
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executors: Dict[str, Any] = {}
+        self._pools: Dict[str, Any] = {}
+        self._snapshot: Dict[str, Any] = {}
+        self._loop_lag: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    def register_executor(self, name: str, executor) -> None:
+        """Track the queue depth of a ThreadPoolExecutor"""
+        self._executors[name] = executor
+    
+    def register_pool(self, name: str, engine) -> None:
+        """Track connection checkouts of a SQLAlchemy engine's pool"""
+        self._pools[name] = engine.pool
+    
+    def watch_event_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Measure the scheduling lag of an event loop"""
+        self.loop = loop
+    
+    def latest(self) -> Dict[str, Any]:
+        """Get the most recent snapshot, starting the sampler if needed"""
+        self.start()
+        return self._snapshot
+    
+    def start(self) -> None:
+        """Start the sampler thread (again in forked worker processes)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+                self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the sampler thread"""
+        self._stop.set()
+    
+    def _run(self) -> None:
+        """Sampler loop"""
+        try:
+            import psutil
+            process = psutil.Process()
+            # The first non-blocking reading only sets the baseline for the next one
+            psutil.cpu_percent(interval=None)
+            process.cpu_percent(interval=None)
+        except ImportError:
+            logger.warning("psutil library not installed. CPU, memory and file descriptor sampling disabled.")
+            psutil = process = None
         
-        # Get memory usage
-        memory = psutil.virtual_memory()
-        memory_percent = memory.percent
-        memory_used = memory.used
+        while not self._stop.wait(self.interval):
+            try:
+                self._snapshot = self._sample(psutil, process)
+                self._publish(self._snapshot)
+                _check_resource_thresholds(self._snapshot)
+            except Exception as e:
+                logger.error(f"Failed to sample system resources: {str(e)}")
+    
+    def _sample(self, psutil, process) -> Dict[str, Any]:
+        """Take one measurement of every tracked resource"""
+        snapshot: Dict[str, Any] = {"timestamp": time.time()}
         
-        # Log resource usage
-        logger.debug(
-            f"System resources: CPU: {cpu_percent}%, Memory: {memory_percent}% ({memory_used / (1024 * 1024):.1f} MB)",
-            extra={"cpu_percent": cpu_percent, "memory_percent": memory_percent, "memory_used": memory_used}
-        )
+        if psutil is not None:
+            memory = psutil.virtual_memory()
+            snapshot["cpu_percent"] = psutil.cpu_percent(interval=None)
+            snapshot["process_cpu_percent"] = process.cpu_percent(interval=None)
+            snapshot["memory_percent"] = memory.percent
+            snapshot["memory_used"] = memory.used
+            snapshot["memory_rss"] = process.memory_info().rss
+            if hasattr(process, "num_fds"):
+                snapshot["open_fds"] = process.num_fds()
         
-        # Record metrics if Prometheus is enabled
-        if PROMETHEUS_ENABLE:
-            set_gauge("cpu_usage_percent", cpu_percent, {"service": "api"})
-            set_gauge("memory_usage_bytes", memory_used, {"service": "api"})
-        
-        # Check if resource usage exceeds thresholds
-        cpu_threshold = PERFORMANCE_THRESHOLDS.get("cpu_usage_percent")
-        if cpu_threshold and cpu_percent > cpu_threshold:
-            send_alert(
-                f"CPU usage threshold exceeded: {cpu_percent}% (threshold: {cpu_threshold}%)",
-                level="warning" if cpu_percent < cpu_threshold * 1.2 else "error",
-                context={"cpu_percent": cpu_percent, "threshold": cpu_threshold}
-            )
+        # Lag measured by the previous probe; schedule the next one
+        if self.loop is not None and not self.loop.is_closed():
+            snapshot["event_loop_lag"] = self._loop_lag
+            scheduled = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(self._record_loop_lag, scheduled)
+            except RuntimeError:
+                self.loop = None
         
-        memory_threshold = PERFORMANCE_THRESHOLDS.get("memory_usage_percent")
-        if memory_threshold and memory_percent > memory_threshold:
-            send_alert(
-                f"Memory usage threshold exceeded: {memory_percent}% (threshold: {memory_threshold}%)",
-                level="warning" if memory_percent < memory_threshold * 1.2 else "error",
-                context={"memory_percent": memory_percent, "threshold": memory_threshold}
-            )
+        snapshot["thread_pool_queue_depth"] = {
+            name: executor._work_queue.qsize() for name, executor in self._executors.items()
+        }
+        snapshot["db_pool"] = {
+            name: {
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0)
+            }
+            for name, pool in self._pools.items()
+            if hasattr(pool, "checkedout")
+        }
+        return snapshot
     
-    except ImportError:
-        logger.warning("psutil library not installed. System monitoring disabled.")
+    def _record_loop_lag(self, scheduled: float) -> None:
+        """Runs on the event loop; the delay since scheduling is the loop's lag"""
+        self._loop_lag = time.monotonic() - scheduled
+    
+    def _publish(self, snapshot: Dict[str, Any]) -> None:
+        """Set the Prometheus gauges from a snapshot"""
+        if not PROMETHEUS_ENABLE:
+            return
+        labels = {"service": self.service}
+        if "cpu_percent" in snapshot:
+            set_gauge("cpu_usage_percent", snapshot["cpu_percent"], labels)
+            set_gauge("memory_usage_bytes", snapshot["memory_used"], labels)
+            set_gauge("memory_rss_bytes", snapshot["memory_rss"], labels)
+        if "open_fds" in snapshot:
+            set_gauge("open_fds", snapshot["open_fds"], labels)
+        if snapshot.get("event_loop_lag") is not None:
+            set_gauge("event_loop_lag_seconds", snapshot["event_loop_lag"], labels)
+        for name, depth in snapshot["thread_pool_queue_depth"].items():
+            set_gauge("thread_pool_queue_depth", depth, {"pool": name})
+        for name, states in snapshot["db_pool"].items():
+            for state, value in states.items():
+                set_gauge("db_pool_connections", value, {"pool": name, "state": state})
+
+resource_sampler = ResourceSampler(interval=RESOURCE_SAMPLE_INTERVAL)
+
+def _check_resource_thresholds(snapshot: Dict[str, Any]) -> None:
+    """Send alerts for resource usage above the configured thresholds"""
+    cpu_percent = snapshot.get("cpu_percent")
+    cpu_threshold = PERFORMANCE_THRESHOLDS.get("cpu_usage_percent")
+    if cpu_percent is not None and cpu_threshold and cpu_percent > cpu_threshold:
+        send_alert(
+            f"CPU usage threshold exceeded: {cpu_percent}% (threshold: {cpu_threshold}%)",
+            level="warning" if cpu_percent < cpu_threshold * 1.2 else "error",
+            context={"cpu_percent": cpu_percent, "threshold": cpu_threshold}
+        )
+    
+    memory_percent = snapshot.get("memory_percent")
+    memory_threshold = PERFORMANCE_THRESHOLDS.get("memory_usage_percent")
+    if memory_percent is not None and memory_threshold and memory_percent > memory_threshold:
+        send_alert(
+            f"Memory usage threshold exceeded: {memory_percent}% (threshold: {memory_threshold}%)",
+            level="warning" if memory_percent < memory_threshold * 1.2 else "error",
+            context={"memory_percent": memory_percent, "threshold": memory_threshold}
+        )
+
+def monitor_system_resources() -> Dict[str, Any]:
+    """Get the latest system resource snapshot without blocking"""
+    try:
+        snapshot = resource_sampler.latest()
+        if "cpu_percent" in snapshot:
+            # Log resource usage
+            logger.debug(
+                f"System resources: CPU: {snapshot['cpu_percent']}%, Memory: {snapshot['memory_percent']}% "
+                f"({snapshot['memory_used'] / (1024 * 1024):.1f} MB)",
+                extra={
+                    "cpu_percent": snapshot["cpu_percent"],
+                    "memory_percent": snapshot["memory_percent"],
+                    "memory_used": snapshot["memory_used"]
+                }
+            )
+        return snapshot
     except Exception as e:
         logger.error(f"Failed to monitor system resources: {str(e)}")
+        return {}
 
 # Initialize monitoring
 def initialize_monitoring():
@@ -528,6 +1108,12 @@ def initialize_monitoring():
         if PROMETHEUS_ENABLE and 'start_metrics_server' in globals():
             start_metrics_server()
         
+        # Add request context fields to log records
+        install_request_context_logging()
+        
+        # Start sampling system resources in the background
+        resource_sampler.start()
+        
         # Log initialization
         logger.info("Monitoring system initialized")
         
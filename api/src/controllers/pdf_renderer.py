@@ -0,0 +1,239 @@
+# RFM Insights - PDF Rendering Module
+
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Dict, Optional
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+from reportlab.lib.units import inch
+
+from controllers.monitoring import RequestContext, resource_sampler
+
+# Setup logger
+logger = logging.getLogger('app.pdf')
+
+# Bump when the PDF layout changes so cached files are not reused
+PDF_TEMPLATE_VERSION = "1"
+
+# Per-worker state: each worker thread builds its stylesheet once and reuses it
+_worker_state = threading.local()
+
+def _get_styles():
+    """Get the stylesheet of the current worker thread"""
+    styles = getattr(_worker_state, "styles", None)
+    if styles is None:
+        styles = getSampleStyleSheet()
+        _worker_state.styles = styles
+    return styles
+
+def pdf_content_hash(message_content: str, company_name: str, message_type: str, created_at: datetime) -> str:
+    """
+    Hash everything that ends up in a message PDF
+
+    The hash names the cached file and doubles as its HTTP ETag
+
+    Args:
+        message_content: Message text
+        company_name: Company name shown in the title
+        message_type: Message type (sms, whatsapp, email)
+        created_at: Message creation date shown in the PDF
+
+    Returns:
+        Hex digest identifying the rendered PDF
+    """
+    digest = hashlib.sha256()
+    for part in (PDF_TEMPLATE_VERSION, message_type, company_name, created_at.isoformat(), message_content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class PDFRenderer:
+    """
+    Renders message PDFs lazily into a content-addressed, size-capped cache
+    Renders run on a bounded pool of worker threads, off the event loop, and
+    duplicate requests for the same content share a single render. When the
+    cache exceeds its size cap, least recently used files are evicted.
+    The cache and its cap belong to one process: N API workers sharing the
+    directory may use up to N times the cap on disk.
+    """
+    def __init__(self, output_dir: str, max_workers: int = 2, max_cache_bytes: int = 512 * 1024 * 1024):
+        """
+        Initialize PDF renderer
+
+        Args:
+            output_dir: Cache directory where PDFs are written
+            max_workers: Maximum number of concurrent renders
+            max_cache_bytes: Disk size cap of the entries this process tracks
+        """
+        self.output_dir = output_dir
+        self.max_cache_bytes = max_cache_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf-render")
+        resource_sampler.register_executor("pdf-render", self._executor)
+        self._pending: Dict[str, Future] = {}
+        # Cache key -> file size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        """Get the cache file path of a key"""
+        return os.path.join(self.output_dir, f"{key}.pdf")
+
+    def _load_index(self) -> None:
+        """Index the files already on disk, ordered by last use (mtime)"""
+        files = []
+        for name in os.listdir(self.output_dir):
+            if name.endswith(".pdf"):
+                stat = os.stat(os.path.join(self.output_dir, name))
+                files.append((stat.st_mtime, name[:-len(".pdf")], stat.st_size))
+        with self._lock:
+            for _, key, size in sorted(files):
+                self._entries[key] = size
+                self._cache_bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used files until the cache fits its cap (lock must be held)"""
+        while self._cache_bytes > self.max_cache_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._cache_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Evicted cached PDF {key} ({size} bytes)")
+
+    def is_cached(self, key: str) -> bool:
+        """
+        Check whether a PDF is already rendered
+
+        Args:
+            key: Content hash from pdf_content_hash
+        """
+        with self._lock:
+            return key in self._entries
+
+    def open_cached(self, key: str) -> Optional[BinaryIO]:
+        """
+        Open a cached PDF, marking it as recently used
+
+        The file is opened under the cache lock, so eviction cannot remove it
+        first; once open, the handle stays readable even if it is evicted later
+
+        Args:
+            key: Content hash from pdf_content_hash
+
+        Returns:
+            PDF opened for binary reading (the caller closes it), or None if it is not cached
+        """
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                self._cache_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            # Persist recency so the LRU order survives restarts
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return file
+
+    def submit(self, key: str, message_content: str, company_name: str, message_type: str, created_at: datetime) -> Future:
+        """
+        Queue a PDF render, reusing the pending render of the same content if any
+
+        Args:
+            key: Content hash from pdf_content_hash
+            message_content: Message text
+            company_name: Company name shown in the title
+            message_type: Message type (sms, whatsapp, email)
+            created_at: Message creation date shown in the PDF
+
+        Returns:
+            Future resolving to the PDF path
+        """
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            # Carry the request context over to the worker thread for logging
+            future = self._executor.submit(
+                RequestContext.bind(self._render), key, message_content, company_name, message_type, created_at
+            )
+            self._pending[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    async def open(self, key: str, message_content: str, company_name: str, message_type: str, created_at: datetime) -> BinaryIO:
+        """
+        Open a PDF from the cache, rendering it first if needed, without blocking the event loop
+
+        Returns:
+            PDF opened for binary reading; the caller closes it
+        """
+        file = self.open_cached(key)
+        while file is None:
+            # Another render may evict the new file before it is opened; render it again then
+            await asyncio.wrap_future(
+                self.submit(key, message_content, company_name, message_type, created_at)
+            )
+            file = self.open_cached(key)
+        return file
+
+    def _forget(self, key: str, future: Future) -> None:
+        """Drop a finished render from the pending table"""
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        if future.exception() is not None:
+            logger.error(f"Failed to render PDF {key}: {future.exception()}")
+
+    def _render(self, key: str, message_content: str, company_name: str, message_type: str, created_at: datetime) -> str:
+        """Build the PDF into the cache (runs on a worker thread)"""
+        pdf_filename = self._path(key)
+        tmp_filename = f"{pdf_filename}.{threading.get_ident()}.tmp"
+
+        styles = _get_styles()
+        story = [
+            Paragraph(f"Mensagem de {message_type.upper()} - {company_name}", styles['Title']),
+            Spacer(1, 0.5 * inch),
+            Paragraph(f"Gerado em: {created_at.strftime('%d/%m/%Y %H:%M')}", styles['Normal']),
+            Spacer(1, 0.25 * inch),
+            Paragraph(message_content.replace('\n', '<br/>'), styles['BodyText']),
+            Spacer(1, 1 * inch),
+            Paragraph("Gerado por RFM Insights", styles['Italic']),
+        ]
+
+        # Write to a temporary file first so downloads never see a partial PDF
+        try:
+            SimpleDocTemplate(tmp_filename, pagesize=letter).build(story)
+            os.replace(tmp_filename, pdf_filename)
+        except BaseException:
+            try:
+                os.remove(tmp_filename)
+            except FileNotFoundError:
+                pass
+            raise
+
+        size = os.path.getsize(pdf_filename)
+        with self._lock:
+            self._cache_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+        return pdf_filename
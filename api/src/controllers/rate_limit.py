@@ -0,0 +1,334 @@
+# RFM Insights - Rate Limit Backends
+
+import os
+import math
+import mmap
+import time
+import struct
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+# Setup logger
+logger = logging.getLogger('app.rate_limit')
+
+def take_token(tokens: float, updated: float, blocked_until: float, now: float,
+               capacity: int, refill_rate: float, block_time: int) -> Tuple[float, float, float, Optional[int]]:
+    """
+    Apply one request to a token bucket
+
+    Args:
+        tokens: Tokens left at the last refill
+        updated: Time of the last refill
+        blocked_until: Time until which the key is blocked
+        now: Current time
+        capacity: Bucket size (requests allowed in a burst)
+        refill_rate: Tokens regained per second
+        block_time: Time to block in seconds after exceeding the rate limit
+
+    Returns:
+        Tuple of (tokens, updated, blocked_until, retry_after); retry_after is None if the request is allowed
+    """
+    # Still blocked
+    if blocked_until > now:
+        return tokens, updated, blocked_until, math.ceil(blocked_until - now)
+
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    if tokens < 1:
+        return tokens, now, now + block_time, block_time
+    return tokens - 1, now, blocked_until, None
+
+class RateLimitBackend:
+    """
+    Storage of rate limit state
+    Implementations apply one request atomically and report whether it is allowed
+    """
+    def __init__(self, rate_limit: int, time_window: int, block_time: int):
+        """
+        Initialize backend
+
+        Args:
+            rate_limit: Maximum number of requests allowed in the time window
+            time_window: Time window in seconds
+            block_time: Time to block in seconds after exceeding rate limit
+        """
+        self.rate_limit = rate_limit
+        self.time_window = time_window
+        self.block_time = block_time
+        # Tokens regained per second
+        self.refill_rate = rate_limit / time_window
+
+    async def hit(self, key: str) -> Optional[int]:
+        """
+        Count a request against a key
+
+        Args:
+            key: Rate limited key (client IP)
+
+        Returns:
+            None if the request is allowed, otherwise the seconds until the key is unblocked
+        """
+        raise NotImplementedError
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-process token buckets in a capped LRU table
+    Each request costs O(1); least recently seen keys are evicted when the table is full
+    and idle entries are swept periodically
+    """
+    def __init__(self, rate_limit: int, time_window: int, block_time: int,
+                 max_keys: int = 100000, sweep_interval: int = 60):
+        """
+        Initialize backend
+
+        Args:
+            max_keys: Maximum number of keys tracked at once
+            sweep_interval: Seconds between sweeps of idle and expired entries
+        """
+        super().__init__(rate_limit, time_window, block_time)
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        # Key -> [tokens, last refill time, blocked until], least recently seen first
+        self.buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    async def hit(self, key: str) -> Optional[int]:
+        return self.check(key)
+
+    def check(self, key: str, now: Optional[float] = None) -> Optional[int]:
+        """
+        Count a request against a key's token bucket
+
+        Args:
+            key: Rate limited key (client IP)
+            now: Current monotonic time, for testing and benchmarks
+
+        Returns:
+            None if the request is allowed, otherwise the seconds until the key is unblocked
+        """
+        if now is None:
+            now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.rate_limit), now, 0.0]
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+
+        bucket[0], bucket[1], bucket[2], retry_after = take_token(
+            bucket[0], bucket[1], bucket[2], now, self.rate_limit, self.refill_rate, self.block_time
+        )
+        return retry_after
+
+    def _sweep(self, now: float) -> None:
+        """
+        Drop entries that have been idle long enough to refill and are not blocked
+
+        Args:
+            now: Current monotonic time
+        """
+        self._next_sweep = now + self.sweep_interval
+        idle_since = now - self.time_window
+        # Entries are ordered by last use, so stop at the first recently used one
+        for key in list(self.buckets):
+            bucket = self.buckets[key]
+            if bucket[1] > idle_since:
+                break
+            if bucket[2] <= now:
+                del self.buckets[key]
+
+class SharedMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets in a memory-mapped file shared by all workers on one host
+    The file holds a fixed-size open-addressing hash table, so memory is bounded;
+    when a key's probe range is full, the least recently used slot in it is reused.
+    Updates are serialized with an exclusive file lock.
+    """
+    # Key hash (0 marks an empty slot), tokens, last refill time, blocked until
+    SLOT = struct.Struct("<Qddd")
+    PROBE_LENGTH = 8
+
+    def __init__(self, rate_limit: int, time_window: int, block_time: int,
+                 path: str = "/dev/shm/rfm_rate_limit", slots: int = 65536):
+        """
+        Initialize backend
+
+        Args:
+            path: Shared file; every worker must use the same path
+            slots: Number of keys the table can hold
+        """
+        if fcntl is None:
+            raise RuntimeError("The shared memory rate limit backend requires a POSIX system")
+        super().__init__(rate_limit, time_window, block_time)
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # The first worker sizes the file; new pages read as zeros, i.e. empty slots
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    async def hit(self, key: str) -> Optional[int]:
+        return self.check(key)
+
+    def check(self, key: str, now: Optional[float] = None) -> Optional[int]:
+        """
+        Count a request against a key's token bucket
+
+        Args:
+            key: Rate limited key (client IP)
+            now: Current wall-clock time (shared by all workers), for testing and benchmarks
+
+        Returns:
+            None if the request is allowed, otherwise the seconds until the key is unblocked
+        """
+        if now is None:
+            now = time.time()
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        start = key_hash % self.slots
+        slot_size = self.SLOT.size
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            offset = None
+            state = None
+            reusable = None
+            oldest = None
+            for i in range(self.PROBE_LENGTH):
+                slot_offset = ((start + i) % self.slots) * slot_size
+                slot = self.SLOT.unpack_from(self._map, slot_offset)
+                if slot[0] == key_hash:
+                    offset, state = slot_offset, slot
+                    break
+                # Empty, or idle long enough to be full again and not blocked
+                if reusable is None and (slot[0] == 0 or (slot[3] <= now and slot[2] <= now - self.time_window)):
+                    reusable = slot_offset
+                if oldest is None or slot[2] < oldest[1]:
+                    oldest = (slot_offset, slot[2])
+
+            if offset is None:
+                offset = reusable if reusable is not None else oldest[0]
+                state = (key_hash, float(self.rate_limit), now, 0.0)
+
+            tokens, updated, blocked_until, retry_after = take_token(
+                state[1], state[2], state[3], now, self.rate_limit, self.refill_rate, self.block_time
+            )
+            self.SLOT.pack_into(self._map, offset, key_hash, tokens, updated, blocked_until)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return retry_after
+
+# Token bucket update run atomically on the Redis server, using the server clock
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local block_time = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'blocked_until')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+local blocked_until = tonumber(state[3]) or 0
+
+if blocked_until > now then
+    return math.ceil(blocked_until - now)
+end
+
+tokens = math.min(capacity, tokens + (now - updated) * refill_rate)
+local retry_after = -1
+if tokens < 1 then
+    blocked_until = now + block_time
+    retry_after = block_time
+else
+    tokens = tokens - 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now, 'blocked_until', blocked_until)
+redis.call('EXPIRE', KEYS[1], ttl)
+return retry_after
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets on a Redis-compatible server, shared by all workers and replicas
+    Each request is one EVALSHA round-trip; keys expire on their own once idle.
+    If the server is unreachable, requests are allowed so authentication keeps working.
+    """
+    def __init__(self, rate_limit: int, time_window: int, block_time: int,
+                 url: str = "redis://localhost:6379/0", prefix: str = "rfm:rate_limit:"):
+        """
+        Initialize backend
+
+        Args:
+            url: Redis server URL
+            prefix: Prefix of the keys written to the server
+        """
+        if redis is None:
+            raise RuntimeError("The redis rate limit backend requires the redis package")
+        super().__init__(rate_limit, time_window, block_time)
+        self.prefix = prefix
+        # Idle buckets are full again after one window, so they can expire then
+        self.ttl = math.ceil(time_window + block_time)
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def hit(self, key: str) -> Optional[int]:
+        try:
+            retry_after = await self._script(
+                keys=[self.prefix + key],
+                args=[self.rate_limit, self.refill_rate, self.block_time, self.ttl]
+            )
+        except redis.RedisError as e:
+            logger.error(f"Rate limit backend unavailable, allowing request: {str(e)}")
+            return None
+        return None if retry_after < 0 else int(retry_after)
+
+RATE_LIMIT_BACKENDS = {
+    "memory": MemoryRateLimitBackend,
+    "shared": SharedMemoryRateLimitBackend,
+    "redis": RedisRateLimitBackend
+}
+
+def create_rate_limit_backend(kind: str, rate_limit: int, time_window: int, block_time: int, **options) -> RateLimitBackend:
+    """
+    Create a rate limit backend
+
+    Args:
+        kind: "memory", "shared" or "redis"
+        rate_limit: Maximum number of requests allowed in the time window
+        time_window: Time window in seconds
+        block_time: Time to block in seconds after exceeding rate limit
+        **options: Backend-specific options
+
+    Returns:
+        Rate limit backend
+
+    Raises:
+        ValueError: If the backend kind is unknown
+    """
+    if kind not in RATE_LIMIT_BACKENDS:
+        raise ValueError(f"Unknown rate limit backend: {kind}")
+    return RATE_LIMIT_BACKENDS[kind](rate_limit, time_window, block_time, **options)
@@ -13,6 +13,8 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 from sklearn.metrics import silhouette_score
 
+from controllers.monitoring import StageTimer
+
 # RFM Segmentation Class
 class RFMAnalysis:
     def __init__(self, data, user_id_col, recency_col, frequency_col, monetary_col, segment_type):
@@ -505,7 +507,7 @@ class PredictiveAnalytics:
         return insights
 
 # API Functions for Frontend Integration
-def analyze_rfm_data(data, user_id_col, recency_col, frequency_col, monetary_col, segment_type):
+def analyze_rfm_data(data, user_id_col, recency_col, frequency_col, monetary_col, segment_type, timer=None):
     """
     Analyze RFM data and return results for frontend visualization
     
@@ -523,30 +525,47 @@ def analyze_rfm_data(data, user_id_col, recency_col, frequency_col, monetary_col
         Column name for monetary value (total spent)
     segment_type : str
         Type of business segment (e.g., 'ecommerce', 'subscription')
+    timer : StageTimer, optional
+        Timer recording each stage; the caller exports it
     
     Returns:
     --------
     dict
         Results of RFM analysis and predictive analytics
     """
+    if timer is None:
+        timer = StageTimer(track_memory=False)
+    if timer.dataset_size is None:
+        timer.dataset_size = len(data)
+    
     # Initialize RFM Analysis
     rfm = RFMAnalysis(data, user_id_col, recency_col, frequency_col, monetary_col, segment_type)
     
-    # Perform RFM Analysis
-    rfm_segments = rfm.segment_customers()
-    segment_counts = rfm.get_segment_counts()
-    segment_stats = rfm.get_segment_stats()
-    treemap_data = rfm.get_treemap_data()
-    polar_area_data = rfm.get_polar_area_data()
+    # Perform RFM Analysis, one stage at a time
+    with timer.stage("preprocess"):
+        rfm.preprocess_data()
+    with timer.stage("scoring"):
+        rfm.calculate_rfm_scores()
+    with timer.stage("segmentation"):
+        rfm_segments = rfm.segment_customers()
+    with timer.stage("stats"):
+        segment_counts = rfm.get_segment_counts()
+        segment_stats = rfm.get_segment_stats()
+        treemap_data = rfm.get_treemap_data()
+        polar_area_data = rfm.get_polar_area_data()
     
     # Initialize Predictive Analytics
     predictive = PredictiveAnalytics(rfm_segments)
     
     # Perform Predictive Analytics
-    churn_results = predictive.predict_churn()
-    upsell_results = predictive.predict_upsell_crosssell()
-    ltv_results = predictive.predict_ltv()
-    insights = predictive.get_predictive_insights()
+    with timer.stage("churn"):
+        churn_results = predictive.predict_churn()
+    with timer.stage("clustering"):
+        upsell_results = predictive.predict_upsell_crosssell()
+    with timer.stage("ltv"):
+        ltv_results = predictive.predict_ltv()
+    with timer.stage("insights"):
+        insights = predictive.get_predictive_insights()
     
     # Combine results
     results = {
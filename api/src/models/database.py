@@ -8,6 +8,9 @@ import logging
 # Use absolute import for better compatibility
 from config import config
 from db_connection import get_database_url
+from backend.database import engine as backend_engine
+from backend.utils.query_stats import query_stats
+from controllers.monitoring import resource_sampler
 
 logger = logging.getLogger('app.database')
 
@@ -23,6 +26,13 @@ engine = create_engine(
     echo=False           # Set to True for SQL query logging
 )
 
+# Time every statement (metrics, N+1 detection, slow query capture)
+query_stats.instrument(engine, "api")
+
+# Publish connection pool usage of both engines used by the API
+resource_sampler.register_pool("api", engine)
+resource_sampler.register_pool("backend", backend_engine)
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
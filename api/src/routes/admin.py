@@ -0,0 +1,33 @@
+# RFM Insights - Admin Routes
+
+from fastapi import APIRouter, Depends, Query
+from typing import Dict, Any
+
+# Import response utilities
+from models.api_utils import success_response
+from models.schemas import ResponseSuccess
+
+from controllers.auth import get_current_admin_user
+from backend.utils.query_stats import query_stats
+
+# Create router
+router = APIRouter()
+
+@router.get("/slow-queries", response_model=ResponseSuccess[Dict[str, Any]], description="Get the slowest recent database statements (admin only)")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=100),
+    current_user = Depends(get_current_admin_user)
+):
+    """
+    Get the slowest recent database statements, one entry per normalized statement
+    
+    Statements are normalized (literals and parameters replaced by ?), so no user data is returned
+    """
+    slow_queries = query_stats.slowest(limit)
+    return success_response(
+        data={
+            "slow_queries": slow_queries,
+            "threshold_ms": query_stats.slow_threshold * 1000
+        },
+        message=f"Retrieved {len(slow_queries)} slow queries"
+    )
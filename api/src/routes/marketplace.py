@@ -1,17 +1,16 @@
 # RFM Insights Marketplace API
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 import os
-import openai
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
-from reportlab.lib.units import inch
+import json
+import asyncio
+import weakref
 
 # Import response utilities
 from models.api_utils import success_response, error_response, paginated_response
@@ -20,119 +19,208 @@ from models.schemas import ResponseSuccess, ResponseError, PaginatedResponseSucc
 from backend import models
 from config import config
 from controllers.auth import get_current_user
-from models.database import get_db
+from models.database import get_db, SessionLocal
+from controllers.pdf_renderer import PDFRenderer, pdf_content_hash
+from backend.utils.llm_cache import llm_cache
+from backend.utils.llm_gateway import CircuitOpenError, get_llm_gateway
+from backend.utils.llm_scheduler import RateLimitExceeded
 
 router = APIRouter()
 
-# Configure OpenAI API
-openai.api_key = config.OPENAI_API_KEY
+SYSTEM_PROMPT = "Você é um especialista em marketing que cria mensagens promocionais personalizadas para segmentos RFM."
+
+# Per-user semaphores bounding concurrent OpenAI calls (dropped once no request holds them)
+_user_llm_semaphores = weakref.WeakValueDictionary()
 
 # PDF directory
 PDF_DIR = "pdfs"
 os.makedirs(PDF_DIR, exist_ok=True)
 
-# Message generation endpoint
-@router.post("/generate-message", response_model=ResponseSuccess[Dict[str, Any]], description="Generate marketing messages for RFM segments")
-async def generate_message(
-    data: dict,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
+# Lazily rendered, content-addressed PDF cache
+pdf_renderer = PDFRenderer(
+    PDF_DIR,
+    max_workers=config.PDF_RENDER_WORKERS,
+    max_cache_bytes=config.PDF_CACHE_MAX_BYTES
+)
+
+def _get_user_semaphore(user_id) -> asyncio.Semaphore:
+    """Get the semaphore limiting a user's concurrent OpenAI calls"""
+    semaphore = _user_llm_semaphores.get(user_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_LLM_CALLS_PER_USER)
+        _user_llm_semaphores[user_id] = semaphore
+    return semaphore
+
+def _sequence_context(sequence_number: int, sequence_total: int) -> str:
+    """Describe the position of a message within its sequence for the prompt"""
+    context = f"Esta é a mensagem {sequence_number} de uma sequência de {sequence_total} mensagens. "
+    if sequence_number == 1:
+        context += "Esta é a primeira mensagem da sequência para iniciar o contato."
+    elif sequence_number == sequence_total:
+        context += "Esta é a última mensagem da sequência para finalizar o contato."
+    else:
+        context += f"Esta é a mensagem de acompanhamento número {sequence_number}."
+    return context
+
+def _cache_key(prompt: str, max_tokens: int, temperature: float) -> str:
+    """Get the response cache key of a message prompt"""
+    return llm_cache.make_key(config.OPENAI_MODEL, SYSTEM_PROMPT, prompt, temperature, max_tokens)
+
+async def _complete_message(user_id, prompt: str, max_tokens: int, temperature: float, use_cache: bool = True) -> str:
+    """
+    Generate one message without blocking the event loop, within the user's concurrency limit
+    
+    Identical prompts are answered from the response cache unless use_cache is False;
+    fresh answers are always stored.
+    """
+    cache_key = _cache_key(prompt, max_tokens, temperature)
+    if use_cache:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    async with _get_user_semaphore(user_id):
+        content = await get_llm_gateway(config.OPENAI_API_KEY).complete(
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            model=config.OPENAI_MODEL,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            user_id=user_id
+        )
+    content = content.strip()
+    await llm_cache.set(cache_key, content)
+    return content
+
+# Number of messages generated in a sequence
+SEQUENCE_LENGTH = 5
+
+async def _stream_message(user_id, prompt: str, max_tokens: int, temperature: float):
+    """Stream one message's tokens as they are generated, within the user's concurrency limit"""
+    cache_key = _cache_key(prompt, max_tokens, temperature)
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    
+    parts = []
+    async with _get_user_semaphore(user_id):
+        async for delta in get_llm_gateway(config.OPENAI_API_KEY).stream(
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            model=config.OPENAI_MODEL,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            user_id=user_id
+        ):
+            parts.append(delta)
+            yield delta
+    # Only complete streams are cached
+    await llm_cache.set(cache_key, "".join(parts).strip())
+
+def _parse_generation_request(data: dict):
+    """
+    Validate a message generation request and build its prompt
+    
+    Returns:
+        Tuple of (message fields, character limit, prompt)
+    """
     # Extract data from request
-    message_type = data.get("messageType")
-    company_name = data.get("companyName")
-    company_website = data.get("companyWebsite")
-    company_description = data.get("companyDescription")
-    segment = data.get("rfmSegment")
-    objective = data.get("objective")
-    seasonality = data.get("seasonality")
-    tone = data.get("tone")
+    fields = {
+        "message_type": data.get("messageType"),
+        "company_name": data.get("companyName"),
+        "company_website": data.get("companyWebsite"),
+        "company_description": data.get("companyDescription"),
+        "segment": data.get("rfmSegment"),
+        "objective": data.get("objective"),
+        "seasonality": data.get("seasonality"),
+        "tone": data.get("tone"),
+    }
     
     # Validate required fields
-    if not all([message_type, company_name, company_description, segment, objective, tone]):
+    required = ("message_type", "company_name", "company_description", "segment", "objective", "tone")
+    if not all(fields[field] for field in required):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Campos obrigatórios não preenchidos")
     
     # Get character limit based on message type
-    char_limit = config.MESSAGE_LIMITS.get(message_type, 500)
+    char_limit = config.MESSAGE_LIMITS.get(fields["message_type"], 500)
     
     # Get prompt template based on message type
-    prompt_template = config.PROMPT_TEMPLATES.get(message_type)
+    prompt_template = config.PROMPT_TEMPLATES.get(fields["message_type"])
     if not prompt_template:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tipo de mensagem inválido")
     
-    # Number of messages to generate in sequence
-    num_messages = 5
-    messages_content = []
-    message_ids = []
+    # Format prompt with data
+    prompt = prompt_template.format(
+        limit=char_limit,
+        segment=fields["segment"],
+        objective=fields["objective"],
+        tone=fields["tone"],
+        company=fields["company_name"]
+    )
+    
+    return fields, char_limit, prompt
+
+def _new_sequence_message(user_id, fields: Dict[str, Any], message_content: str, sequence_number: int):
+    """Build a message of a generated sequence, with a client-side ID known before commit"""
+    return models.Message(
+        id=models.generate_uuid(),
+        user_id=user_id,
+        message=message_content,
+        regeneration_attempts=0,
+        sequence_number=sequence_number,
+        sequence_total=SEQUENCE_LENGTH,
+        **fields
+    )
+
+def _sse_event(event: str, payload: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+# Message generation endpoint
+@router.post("/generate-message", response_model=ResponseSuccess[Dict[str, Any]], description="Generate marketing messages for RFM segments")
+async def generate_message(
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    fields, char_limit, prompt = _parse_generation_request(data)
     
     try:
-        for i in range(num_messages):
-            # Format prompt with data and message number
-            prompt = prompt_template.format(
-                limit=char_limit,
-                segment=segment,
-                objective=objective,
-                tone=tone,
-                company=company_name
-            )
-            
-            # Add message number context to prompt for sequence
-            sequence_context = f"Esta é a mensagem {i+1} de uma sequência de {num_messages} mensagens. "
-            if i == 0:
-                sequence_context += "Esta é a primeira mensagem da sequência para iniciar o contato."
-            elif i == num_messages - 1:
-                sequence_context += "Esta é a última mensagem da sequência para finalizar o contato."
-            else:
-                sequence_context += f"Esta é a mensagem de acompanhamento número {i+1}."
-            
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model=config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "Você é um especialista em marketing que cria mensagens promocionais personalizadas para segmentos RFM."},
-                    {"role": "user", "content": sequence_context + " " + prompt}
-                ],
+        # Generate the whole sequence concurrently
+        completions = [
+            asyncio.create_task(_complete_message(
+                current_user.id,
+                _sequence_context(i + 1, SEQUENCE_LENGTH) + " " + prompt,
                 max_tokens=char_limit,
-                n=1,
-                temperature=0.7,
-            )
-            
-            # Extract message from response
-            message_content = response.choices[0].message.content.strip()
-            messages_content.append(message_content)
-            
-            # Create new message in database
-            new_message = models.Message(
-                user_id=current_user.id,
-                message_type=message_type,
-                company_name=company_name,
-                company_website=company_website,
-                company_description=company_description,
-                segment=segment,
-                objective=objective,
-                seasonality=seasonality,
-                tone=tone,
-                message=message_content,
-                regeneration_attempts=0,
-                sequence_number=i+1,
-                sequence_total=num_messages
-            )
-            
-            db.add(new_message)
-            db.commit()
-            db.refresh(new_message)
-            message_ids.append(new_message.id)
-            
-            # Generate PDF in background
-            background_tasks.add_task(
-                generate_pdf_for_message,
-                new_message.id,
-                message_content,
-                company_name,
-                message_type,
-                db
-            )
+                temperature=0.7
+            ))
+            for i in range(SEQUENCE_LENGTH)
+        ]
+        try:
+            messages_content = await asyncio.gather(*completions)
+        except BaseException:
+            # The response fails with the first error; stop spending tokens on the other messages
+            for completion in completions:
+                completion.cancel()
+            await asyncio.gather(*completions, return_exceptions=True)
+            raise
+        
+        # Client-side IDs let the rows be inserted in one batch
+        # without refreshing each row after commit
+        new_messages = [
+            _new_sequence_message(current_user.id, fields, message_content, i + 1)
+            for i, message_content in enumerate(messages_content)
+        ]
+        message_ids = [new_message.id for new_message in new_messages]
+        
+        # Persist the whole sequence in a single transaction
+        db.add_all(new_messages)
+        db.commit()
         
         # Return all messages and their IDs
         return {
@@ -141,15 +229,103 @@ async def generate_message(
             "primary_id": message_ids[0] if message_ids else None
         }
     
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao gerar mensagem: {str(e)}")
 
+# Streaming message generation endpoint
+@router.post("/generate-message/stream", description="Generate marketing messages for RFM segments, streaming tokens as Server-Sent Events")
+async def generate_message_stream(
+    data: dict,
+    current_user = Depends(get_current_user)
+):
+    """
+    Stream a message sequence as Server-Sent Events
+    
+    Events: "token" {index, delta} as text is generated, "message" {index, id, message}
+    once a message is complete and saved, "error" {index, detail} if a message fails
+    (with retry_after when rate limited),
+    and a final "done" {ids, primary_id}
+    """
+    fields, char_limit, prompt = _parse_generation_request(data)
+    
+    return StreamingResponse(
+        _sequence_events(current_user.id, fields, char_limit, prompt),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _sequence_events(user_id, fields: Dict[str, Any], char_limit: int, prompt: str):
+    """Generate the sequence concurrently, yielding SSE events and saving each message as it completes"""
+    queue: asyncio.Queue = asyncio.Queue()
+    message_ids: List[Optional[str]] = [None] * SEQUENCE_LENGTH
+    
+    async def produce(index: int):
+        parts = []
+        try:
+            async for delta in _stream_message(
+                user_id,
+                _sequence_context(index + 1, SEQUENCE_LENGTH) + " " + prompt,
+                max_tokens=char_limit,
+                temperature=0.7
+            ):
+                parts.append(delta)
+                await queue.put(("token", {"index": index, "delta": delta}))
+            await queue.put(("message", {"index": index, "message": "".join(parts).strip()}))
+        except RateLimitExceeded as e:
+            await queue.put(("error", {"index": index, "detail": str(e), "retry_after": e.retry_after}))
+        except Exception as e:
+            await queue.put(("error", {"index": index, "detail": f"Erro ao gerar mensagem: {str(e)}"}))
+    
+    producers = [asyncio.create_task(produce(i)) for i in range(SEQUENCE_LENGTH)]
+    try:
+        remaining = SEQUENCE_LENGTH
+        while remaining:
+            event, payload = await queue.get()
+            if event == "message":
+                index = payload["index"]
+                new_message = _new_sequence_message(user_id, fields, payload["message"], index + 1)
+                message_id = new_message.id
+                try:
+                    await run_in_threadpool(_save_message, new_message)
+                    payload["id"] = message_ids[index] = message_id
+                except Exception as e:
+                    event, payload = "error", {"index": index, "detail": f"Erro ao salvar mensagem: {str(e)}"}
+            if event != "token":
+                remaining -= 1
+            yield _sse_event(event, payload)
+        
+        yield _sse_event("done", {"ids": message_ids, "primary_id": message_ids[0]})
+    finally:
+        # Stop generating if the client went away
+        for producer in producers:
+            producer.cancel()
+
+def _save_message(message) -> None:
+    """Commit a message in its own session (blocking, so call it through run_in_threadpool)"""
+    # The request session is already closed while the response streams
+    db = SessionLocal()
+    try:
+        db.add(message)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
 # Regenerate message endpoint
 @router.post("/regenerate-message")
 async def regenerate_message(
     data: dict,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -187,33 +363,19 @@ async def regenerate_message(
         company=original_message.company_name
     )
     
-    # Add sequence context to prompt
-    sequence_context = f"Esta é a mensagem {original_message.sequence_number} de uma sequência de {original_message.sequence_total} mensagens. "
-    if original_message.sequence_number == 1:
-        sequence_context += "Esta é a primeira mensagem da sequência para iniciar o contato."
-    elif original_message.sequence_number == original_message.sequence_total:
-        sequence_context += "Esta é a última mensagem da sequência para finalizar o contato."
-    else:
-        sequence_context += f"Esta é a mensagem de acompanhamento número {original_message.sequence_number}."
-    
     try:
         # Call OpenAI API
-        response = openai.ChatCompletion.create(
-            model=config.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "Você é um especialista em marketing que cria mensagens promocionais personalizadas para segmentos RFM."},
-                {"role": "user", "content": sequence_context + " " + prompt}
-            ],
+        message_content = await _complete_message(
+            current_user.id,
+            _sequence_context(original_message.sequence_number, original_message.sequence_total) + " " + prompt,
             max_tokens=char_limit,
-            n=1,
             temperature=0.8,  # Slightly higher temperature for variation
+            use_cache=False  # A regeneration must not return the previous answer
         )
         
-        # Extract message from response
-        message_content = response.choices[0].message.content.strip()
-        
         # Create new message in database as a regeneration
         new_message = models.Message(
+            id=models.generate_uuid(),
             user_id=current_user.id,
             message_type=original_message.message_type,
             company_name=original_message.company_name,
@@ -231,25 +393,23 @@ async def regenerate_message(
         )
         
         db.add(new_message)
+        new_message_id = new_message.id
         
         # Update original message's regeneration count
         original_message.regeneration_attempts += 1
         
         db.commit()
-        db.refresh(new_message)
-        
-        # Generate PDF in background
-        background_tasks.add_task(
-            generate_pdf_for_message,
-            new_message.id,
-            message_content,
-            original_message.company_name,
-            original_message.message_type,
-            db
-        )
         
-        return {"message": message_content, "id": new_message.id}
+        return {"message": message_content, "id": new_message_id}
     
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao regenerar mensagem: {str(e)}")
@@ -279,7 +439,10 @@ async def get_message_history(
             "objective": msg.objective,
             "seasonality": msg.seasonality,
             "created_at": msg.created_at.isoformat(),
-            "has_pdf": bool(msg.pdf_path)
+            # PDFs are rendered on first download
+            "has_pdf": pdf_renderer.is_cached(
+                pdf_content_hash(msg.message, msg.company_name, msg.message_type, msg.created_at)
+            )
         })
     
     return result
@@ -314,7 +477,7 @@ async def get_message(
 @router.get("/download-message/{message_id}")
 async def download_message(
     message_id: int,
-    background_tasks: BackgroundTasks,
+    request: Request,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -327,65 +490,66 @@ async def download_message(
     if not message:
         raise HTTPException(status_code=404, detail="Mensagem não encontrada")
     
-    # Check if PDF exists, if not generate it
-    if not message.pdf_path or not os.path.exists(message.pdf_path):
-        pdf_path = generate_pdf_for_message(
-            message.id,
-            message.message,
-            message.company_name,
-            message.message_type,
-            db
-        )
-    else:
-        pdf_path = message.pdf_path
+    # The content hash names the cached PDF and is its ETag
+    content_hash = pdf_content_hash(
+        message.message,
+        message.company_name,
+        message.message_type,
+        message.created_at
+    )
+    etag = f'"{content_hash}"'
+    last_modified = message.created_at.replace(tzinfo=timezone.utc, microsecond=0)
+    cache_headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": "private, no-cache"
+    }
+    
+    # Answer repeat downloads without rendering or reading the file
+    if _is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    
+    # Render on first download; the open handle survives cache eviction while streaming
+    pdf_file = await pdf_renderer.open(
+        content_hash,
+        message.message,
+        message.company_name,
+        message.message_type,
+        message.created_at
+    )
     
     # Return file
-    return FileResponse(
-        path=pdf_path,
-        filename=f"mensagem-{message_id}.pdf",
-        media_type="application/pdf"
+    return StreamingResponse(
+        _iter_file(pdf_file),
+        media_type="application/pdf",
+        headers={
+            **cache_headers,
+            "Content-Length": str(os.fstat(pdf_file.fileno()).st_size),
+            "Content-Disposition": f'attachment; filename="mensagem-{message_id}.pdf"'
+        }
     )
 
-# Helper function to generate PDF
-def generate_pdf_for_message(message_id, message_content, company_name, message_type, db):
-    # Create PDF filename
-    pdf_filename = f"{PDF_DIR}/message_{message_id}.pdf"
-    
-    # Create PDF
-    doc = SimpleDocTemplate(pdf_filename, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Add title
-    title_style = styles['Title']
-    title = Paragraph(f"Mensagem de {message_type.upper()} - {company_name}", title_style)
-    story.append(title)
-    story.append(Spacer(1, 0.5 * inch))
-    
-    # Add date
-    date_style = styles['Normal']
-    date_text = Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style)
-    story.append(date_text)
-    story.append(Spacer(1, 0.25 * inch))
-    
-    # Add message content
-    content_style = styles['BodyText']
-    content = Paragraph(message_content.replace('\n', '<br/>'), content_style)
-    story.append(content)
-    
-    # Add footer
-    story.append(Spacer(1, 1 * inch))
-    footer_style = styles['Italic']
-    footer = Paragraph("Gerado por RFM Insights", footer_style)
-    story.append(footer)
-    
-    # Build PDF
-    doc.build(story)
-    
-    # Update message in database with PDF path
-    message = db.query(models.Message).filter(models.Message.id == message_id).first()
-    if message:
-        message.pdf_path = pdf_filename
-        db.commit()
+def _iter_file(file, chunk_size: int = 64 * 1024):
+    """Read an open file in chunks, closing it once streamed (or abandoned)"""
+    with file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def _is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate the conditional request headers (If-None-Match takes precedence)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates or "*" in candidates
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
     
-    return pdf_filename
\ No newline at end of file
+    return False
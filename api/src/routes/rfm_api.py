@@ -1,12 +1,13 @@
 # RFM Insights - API Module
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 import pandas as pd
 import io
-import json
 import datetime
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 # Import response utilities
 from models.api_utils import success_response
@@ -14,6 +15,9 @@ from models.schemas import ResponseSuccess
 
 # Import RFM Analysis module
 from controllers.rfm_analysis import analyze_rfm_data
+from controllers.analysis_history import AnalysisHistoryStore
+from controllers.monitoring import StageTimer
+from controllers.auth import get_current_user
 
 # Create router
 router = APIRouter()
@@ -22,22 +26,33 @@ router = APIRouter()
 HISTORY_DIR = "analysis_history"
 os.makedirs(HISTORY_DIR, exist_ok=True)
 
+# Indexed per-user history store
+history_store = AnalysisHistoryStore(os.path.join(HISTORY_DIR, "history.sqlite3"))
+
 @router.post("/analyze-rfm", response_model=ResponseSuccess[Dict[str, Any]], description="Analyze RFM data from uploaded CSV file and generate customer segments")
 async def analyze_rfm(
+    response: Response,
     file: UploadFile = File(...),
     segment_type: str = Form(...),
     user_id_col: str = Form(...),
     recency_col: str = Form(...),
     frequency_col: str = Form(...),
-    monetary_col: str = Form(...)
+    monetary_col: str = Form(...),
+    current_user = Depends(get_current_user)
 ):
     """
     Analyze RFM data from uploaded CSV file
+    
+    The time and peak memory of each stage are exported as metrics and returned
+    in the Server-Timing response header
     """
+    timer = StageTimer()
     try:
         # Read CSV file
         contents = await file.read()
-        data = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        with timer.stage("parse"):
+            data = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        timer.dataset_size = len(data)
         
         # Validate required columns
         required_cols = [user_id_col, recency_col, frequency_col, monetary_col]
@@ -56,13 +71,11 @@ async def analyze_rfm(
             recency_col=recency_col,
             frequency_col=frequency_col,
             monetary_col=monetary_col,
-            segment_type=segment_type
+            segment_type=segment_type,
+            timer=timer
         )
         
         # Save analysis to history
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{file.filename}"
-        
         history_entry = {
             "filename": file.filename,
             "timestamp": datetime.datetime.now().isoformat(),
@@ -80,13 +93,19 @@ async def analyze_rfm(
             }
         }
         
-        # Save history entry
-        with open(os.path.join(HISTORY_DIR, f"{timestamp}_meta.json"), "w") as f:
-            json.dump(history_entry, f)
+        # Save history entry (SQLite, so off the event loop)
+        await run_in_threadpool(history_store.add, current_user.id, history_entry)
         
         # Add history entry to results
         results["history_entry"] = history_entry
         
+        # Convert results to JSON-compatible types here, so the time shows up as a stage
+        with timer.stage("serialization"):
+            results = jsonable_encoder(results)
+        
+        timer.observe()
+        response.headers["Server-Timing"] = timer.server_timing()
+        
         return success_response(
             data=results,
             message="RFM analysis completed successfully"
@@ -97,35 +116,40 @@ async def analyze_rfm(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing file: {str(e)}"
         )
+    
+    finally:
+        # Stop memory tracking even when the analysis fails
+        timer.finish()
 
-@router.get("/analysis-history", response_model=ResponseSuccess[Dict[str, List[Dict[str, Any]]]], description="Get analysis history with optional limit parameter")
-async def get_analysis_history(limit: int = 5):
+@router.get("/analysis-history", response_model=ResponseSuccess[Dict[str, Any]], description="Get the current user's analysis history, newest first, with cursor pagination")
+def get_analysis_history(
+    limit: int = Query(5, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
     """
     Get analysis history (limited to the most recent entries)
+    
+    Pass the returned next_cursor as cursor to fetch the following page
+    A plain function, so FastAPI runs the SQLite query in its threadpool
     """
     try:
-        history_files = [f for f in os.listdir(HISTORY_DIR) if f.endswith("_meta.json")]
-        history_files.sort(reverse=True)  # Sort by timestamp (newest first)
-        
-        history = []
-        for i, file in enumerate(history_files):
-            if i >= limit:
-                break
-                
-            with open(os.path.join(HISTORY_DIR, file), "r") as f:
-                history_entry = json.load(f)
-                history.append(history_entry)
-        
-        return success_response(
-            data={"history": history},
-            message=f"Retrieved {len(history)} analysis history records"
+        history, next_cursor = history_store.list(current_user.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
-    
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving analysis history: {str(e)}"
         )
+    
+    return success_response(
+        data={"history": history, "next_cursor": next_cursor},
+        message=f"Retrieved {len(history)} analysis history records"
+    )
 
 @router.get("/segment-descriptions", response_model=ResponseSuccess[Dict[str, Dict[str, str]]], description="Get descriptions for RFM segments")
 async def get_segment_descriptions():
@@ -0,0 +1,49 @@
+# RFM Insights - Analysis History Store Tests
+
+import pytest
+
+from controllers.analysis_history import AnalysisHistoryStore
+
+@pytest.fixture
+def store(tmp_path) -> AnalysisHistoryStore:
+    return AnalysisHistoryStore(str(tmp_path / "history.sqlite3"))
+
+def entry(number: int, timestamp: str) -> dict:
+    return {"filename": f"file-{number}.csv", "timestamp": timestamp}
+
+def read_all_pages(store: AnalysisHistoryStore, user_id: str, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        page, cursor = store.list(user_id, limit, cursor)
+        pages.append([item["filename"] for item in page])
+        if cursor is None:
+            return pages
+
+def test_pages_have_no_duplicates_or_gaps_when_timestamps_tie(store):
+    # Seven entries sharing timestamps, including ties across page boundaries
+    timestamps = ["2026-10-01T10:00:00"] * 4 + ["2026-10-02T09:00:00"] * 2 + ["2026-10-03T08:00:00"]
+    for number, timestamp in enumerate(timestamps):
+        store.add("alice", entry(number, timestamp))
+
+    pages = read_all_pages(store, "alice", limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    # Newest first; entries with the same timestamp in reverse insertion order
+    assert sum(pages, []) == [f"file-{number}.csv" for number in (6, 5, 4, 3, 2, 1, 0)]
+
+def test_last_full_page_has_no_cursor(store):
+    for number in range(4):
+        store.add("alice", entry(number, f"2026-10-0{number + 1}T10:00:00"))
+
+    assert read_all_pages(store, "alice", limit=2) == [["file-3.csv", "file-2.csv"], ["file-1.csv", "file-0.csv"]]
+
+def test_users_only_see_their_own_history(store):
+    store.add("alice", entry(0, "2026-10-01T10:00:00"))
+    store.add("bob", entry(1, "2026-10-01T10:00:00"))
+
+    assert store.list("bob", 10) == ([entry(1, "2026-10-01T10:00:00")], None)
+
+@pytest.mark.parametrize("cursor", ["garbage", "2026-10-01T10:00:00|", "|12", "2026-10-01T10:00:00|x"])
+def test_malformed_cursor_is_rejected(store, cursor):
+    with pytest.raises(ValueError):
+        store.list("alice", 10, cursor)
@@ -0,0 +1,44 @@
+# RFM Insights - Middleware Tests
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config import config
+from controllers.middleware import RequestPipelineMiddleware, RequestValidator
+from models.api_utils import get_api_prefix
+
+def make_client() -> TestClient:
+    """Build an app with the auth token route mounted where main.py mounts it"""
+    app = FastAPI()
+
+    @app.post(f"{get_api_prefix()}/auth/token")
+    async def token():
+        return {"access_token": "token"}
+
+    @app.post(f"{get_api_prefix()}/rfm/analyze-rfm")
+    async def analyze():
+        return {"status": "ok"}
+
+    app.add_middleware(RequestPipelineMiddleware)
+    return TestClient(app)
+
+def test_sixth_token_request_is_rate_limited():
+    client = make_client()
+    for _ in range(5):
+        assert client.post("/api/v1/auth/token").status_code == 200
+
+    response = client.post("/api/v1/auth/token")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 0
+
+def test_other_endpoints_are_not_rate_limited():
+    client = make_client()
+    for _ in range(6):
+        assert client.post("/api/v1/rfm/analyze-rfm").status_code == 200
+
+def test_upload_route_gets_its_body_limit_under_the_api_prefix():
+    validator = RequestValidator(None)
+    upload_limit = config.REQUEST_BODY_ROUTE_LIMITS["/rfm/analyze-rfm"]
+
+    assert validator.body_limit(f"{get_api_prefix()}/rfm/analyze-rfm") == upload_limit
+    assert validator.body_limit(f"{get_api_prefix()}/auth/token") == config.REQUEST_BODY_MAX_BYTES
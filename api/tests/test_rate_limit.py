@@ -0,0 +1,53 @@
+# RFM Insights - Rate Limit Backend Tests
+
+import pytest
+
+from controllers.rate_limit import MemoryRateLimitBackend, SharedMemoryRateLimitBackend
+
+RATE_LIMIT, TIME_WINDOW, BLOCK_TIME = 5, 60, 300
+
+@pytest.fixture(params=["memory", "shared"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryRateLimitBackend(RATE_LIMIT, TIME_WINDOW, BLOCK_TIME)
+    return SharedMemoryRateLimitBackend(RATE_LIMIT, TIME_WINDOW, BLOCK_TIME, path=str(tmp_path / "rate_limit"), slots=64)
+
+def test_block_window(backend):
+    for _ in range(RATE_LIMIT):
+        assert backend.check("10.0.0.1", now=1000.0) is None
+
+    # The request over the limit starts the block
+    assert backend.check("10.0.0.1", now=1000.0) == BLOCK_TIME
+    # Blocked requests report the time left and do not extend the block
+    assert backend.check("10.0.0.1", now=1100.0) == BLOCK_TIME - 100
+    assert backend.check("10.0.0.1", now=1299.5) == 1
+    # Other clients are unaffected
+    assert backend.check("10.0.0.2", now=1100.0) is None
+    # Once the block is over the bucket has refilled
+    assert backend.check("10.0.0.1", now=1000.0 + BLOCK_TIME) is None
+
+def test_shared_slots_are_reused_after_idle(tmp_path):
+    # Two slots, so every key probes both of them
+    backend = SharedMemoryRateLimitBackend(RATE_LIMIT, TIME_WINDOW, BLOCK_TIME, path=str(tmp_path / "rate_limit"), slots=2)
+    assert backend.check("idle", now=0.0) is None
+    for _ in range(RATE_LIMIT + 1):
+        backend.check("blocked", now=0.0)
+
+    # "idle" has refilled and is not blocked, so its slot goes to the new key...
+    assert backend.check("new", now=TIME_WINDOW + 1.0) is None
+    # ...while the blocked key keeps its state
+    assert backend.check("blocked", now=TIME_WINDOW + 2.0) == BLOCK_TIME - TIME_WINDOW - 2
+    # The evicted key starts again with a full bucket
+    for _ in range(RATE_LIMIT):
+        assert backend.check("idle", now=TIME_WINDOW + 3.0) is None
+
+def test_shared_state_is_seen_by_every_worker(tmp_path):
+    path = str(tmp_path / "rate_limit")
+    first = SharedMemoryRateLimitBackend(RATE_LIMIT, TIME_WINDOW, BLOCK_TIME, path=path, slots=64)
+    second = SharedMemoryRateLimitBackend(RATE_LIMIT, TIME_WINDOW, BLOCK_TIME, path=path, slots=64)
+
+    for i in range(RATE_LIMIT):
+        worker = first if i % 2 else second
+        assert worker.check("10.0.0.1", now=0.0) is None
+    assert first.check("10.0.0.1", now=0.0) == BLOCK_TIME
+    assert second.check("10.0.0.1", now=10.0) == BLOCK_TIME - 10
@@ -157,6 +157,43 @@ const apiClient = {
         });
     },
 
+    // Generate a message sequence, calling onEvent(event, payload) for each Server-Sent Event
+    async generateMessageStream(messageData, onEvent) {
+        const url = `${this.baseUrl}/api/${this.version}/marketplace/generate-message/stream`;
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: { ...this.getHeaders(), 'Accept': 'text/event-stream' },
+            body: JSON.stringify(messageData)
+        });
+        if (!response.ok) {
+            return this.handleResponse(response);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                onEvent(event, data ? JSON.parse(data) : null);
+            }
+        }
+    },
+
     async regenerateMessage(messageId) {
         return this.request('/marketplace/regenerate-message', {
             method: 'POST',
@@ -54,11 +54,27 @@ document.addEventListener('DOMContentLoaded', function() {
         try {
             generateButton.disabled = true;
             
-            const result = await apiClient.generateMessage(data);
-            currentMessageIds = result.ids || [];
-            currentMessages = result.messages || [];
+            currentMessageIds = [];
+            currentMessages = [];
             currentSequenceIndex = 0;
             
+            // Render tokens as they arrive instead of waiting for the whole sequence
+            await apiClient.generateMessageStream(data, function(event, payload) {
+                if (event === 'token') {
+                    currentMessages[payload.index] = (currentMessages[payload.index] || '') + payload.delta;
+                } else if (event === 'message') {
+                    currentMessages[payload.index] = payload.message;
+                    currentMessageIds[payload.index] = payload.id;
+                } else if (event === 'error') {
+                    console.error('Erro ao gerar mensagem:', payload.detail);
+                } else {
+                    return;
+                }
+                if (payload.index === currentSequenceIndex) {
+                    displayCurrentMessage();
+                }
+            });
+            
             displayCurrentMessage();
             regenerationAttempts = 0;
             updateRegenerateButton();
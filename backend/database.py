@@ -1,11 +1,14 @@
 # RFM Insights - Database Module
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 import logging
 from typing import Generator
 import os
+import uuid
+
+from .utils.query_stats import query_stats
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,6 +27,9 @@ engine = create_engine(
     echo=False          # Set to True to log all SQL queries
 )
 
+# Time every statement (metrics, N+1 detection, slow query capture)
+query_stats.instrument(engine, "backend")
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -72,4 +78,54 @@ def check_db_connection() -> bool:
         return True
     except Exception as e:
         logger.error(f"Database connection error: {e}")
-        return False 
\ No newline at end of file
+        return False
+
+def customer_records_partition_name(analysis_id: str) -> str:
+    """
+    Get the name of the customer_records partition holding an analysis.
+    
+    Args:
+        analysis_id: ID of the analysis
+        
+    Returns:
+        str: Partition table name
+        
+    Raises:
+        ValueError: If analysis_id is not a valid UUID
+    """
+    # Validating the UUID also guarantees the value is safe to inline in DDL
+    return f"customer_records_{uuid.UUID(analysis_id).hex}"
+
+def create_customer_records_partition(db: Session, analysis_id: str) -> str:
+    """
+    Create the customer_records partition for an analysis if it does not exist.
+    
+    Must be called before inserting customer records for the analysis.
+    
+    Args:
+        db: Database session
+        analysis_id: ID of the analysis
+        
+    Returns:
+        str: Partition table name
+    """
+    partition = customer_records_partition_name(analysis_id)
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition} "
+        f"PARTITION OF customer_records FOR VALUES IN ('{analysis_id}')"
+    ))
+    return partition
+
+def drop_customer_records_partition(db: Session, analysis_id: str) -> None:
+    """
+    Drop the customer_records partition of an analysis.
+    
+    Removes all customer records of the analysis without a row-by-row DELETE,
+    so neither the table nor its indexes are left bloated.
+    
+    Args:
+        db: Database session
+        analysis_id: ID of the analysis
+    """
+    partition = customer_records_partition_name(analysis_id)
+    db.execute(text(f"DROP TABLE IF EXISTS {partition}"))
@@ -58,6 +58,7 @@ class RFMAnalysis(Base):
     user = relationship("User", back_populates="rfm_analyses")
     insights = relationship("AIInsight", back_populates="analysis")
     customer_records = relationship("CustomerRecord", back_populates="analysis")
+    segment_summaries = relationship("SegmentSummary", back_populates="analysis")
 
     __table_args__ = (
         Index('idx_rfm_user_date', user_id, analysis_date),
@@ -68,7 +69,8 @@ class CustomerRecord(Base):
     __tablename__ = "customer_records"
 
     id = Column(String, primary_key=True, default=generate_uuid)
-    analysis_id = Column(String, ForeignKey("rfm_analyses.id"), nullable=False)
+    # Partition key; PostgreSQL requires it in every unique constraint of a partitioned table
+    analysis_id = Column(String, ForeignKey("rfm_analyses.id"), primary_key=True)
     customer_id = Column(String, nullable=False)  # Original customer identifier
     recency_value = Column(Float, nullable=False)
     frequency_value = Column(Integer, nullable=False)
@@ -84,10 +86,41 @@ class CustomerRecord(Base):
     # Relationships
     analysis = relationship("RFMAnalysis", back_populates="customer_records")
 
+    # One list partition per analysis (see backend.database.create_customer_records_partition),
+    # so per-analysis queries prune to a single partition and deleting an analysis is a DROP TABLE
     __table_args__ = (
-        Index('idx_customer_analysis', analysis_id),
         Index('idx_customer_segment', segment),
         UniqueConstraint('analysis_id', 'customer_id', name='uq_analysis_customer'),
+        {'postgresql_partition_by': 'LIST (analysis_id)'},
+    )
+
+class SegmentSummary(Base):
+    __tablename__ = "segment_summaries"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    analysis_id = Column(String, ForeignKey("rfm_analyses.id"), nullable=False)
+    segment = Column(String, nullable=False)
+    customer_count = Column(Integer, nullable=False)
+    recency_score_sum = Column(Integer, nullable=False)
+    frequency_score_sum = Column(Integer, nullable=False)
+    monetary_score_sum = Column(Integer, nullable=False)
+    recency_score_avg = Column(Float, nullable=False)
+    frequency_score_avg = Column(Float, nullable=False)
+    monetary_score_avg = Column(Float, nullable=False)
+    recency_value_avg = Column(Float, nullable=False)
+    frequency_value_avg = Column(Float, nullable=False)
+    monetary_value_sum = Column(Float, nullable=False)  # Total monetary value of the segment
+    monetary_value_avg = Column(Float, nullable=False)
+    churn_probability_avg = Column(Float)  # Only when churn predictions are available
+    predicted_ltv_sum = Column(Float)      # Only when LTV predictions are available
+    predicted_ltv_avg = Column(Float)
+    created_at = Column(DateTime, default=func.now())
+
+    # Relationships
+    analysis = relationship("RFMAnalysis", back_populates="segment_summaries")
+
+    __table_args__ = (
+        UniqueConstraint('analysis_id', 'segment', name='uq_summary_analysis_segment'),
     )
 
 class AIInsight(Base):
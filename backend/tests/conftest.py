@@ -0,0 +1,9 @@
+"""Test configuration for the backend package."""
+
+import os
+import sys
+
+# The repository root, so the backend package imports as in the application
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
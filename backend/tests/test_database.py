@@ -0,0 +1,64 @@
+"""Tests for the customer_records partition helpers."""
+
+import uuid
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from backend.database import (
+    create_customer_records_partition,
+    customer_records_partition_name,
+    drop_customer_records_partition,
+)
+from backend.models import CustomerRecord
+
+ANALYSIS_ID = "3f2b8c1e-9a4d-4e7b-8c21-5d6f7a8b9c0d"
+
+class RecordingSession:
+    """Stands in for a Session, keeping the SQL it is asked to execute."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+def test_partition_name_is_derived_from_the_uuid():
+    assert customer_records_partition_name(ANALYSIS_ID) == f"customer_records_{uuid.UUID(ANALYSIS_ID).hex}"
+
+@pytest.mark.parametrize("analysis_id", [
+    "not-a-uuid",
+    "",
+    "x'); DROP TABLE users; --",
+    ANALYSIS_ID + "'",
+])
+def test_invalid_analysis_ids_never_reach_the_ddl(analysis_id):
+    db = RecordingSession()
+    with pytest.raises(ValueError):
+        create_customer_records_partition(db, analysis_id)
+    with pytest.raises(ValueError):
+        drop_customer_records_partition(db, analysis_id)
+    assert db.statements == []
+
+def test_create_partition_ddl():
+    db = RecordingSession()
+    partition = create_customer_records_partition(db, ANALYSIS_ID)
+
+    assert partition == customer_records_partition_name(ANALYSIS_ID)
+    assert db.statements == [
+        f"CREATE TABLE IF NOT EXISTS {partition} "
+        f"PARTITION OF customer_records FOR VALUES IN ('{ANALYSIS_ID}')"
+    ]
+
+def test_drop_partition_ddl():
+    db = RecordingSession()
+    drop_customer_records_partition(db, ANALYSIS_ID)
+
+    assert db.statements == [f"DROP TABLE IF EXISTS {customer_records_partition_name(ANALYSIS_ID)}"]
+
+def test_customer_records_is_list_partitioned_by_analysis():
+    ddl = str(CreateTable(CustomerRecord.__table__).compile(dialect=postgresql.dialect()))
+
+    assert "PARTITION BY LIST (analysis_id)" in ddl
+    assert "PRIMARY KEY (id, analysis_id)" in ddl
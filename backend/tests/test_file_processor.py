@@ -0,0 +1,50 @@
+"""Tests for the processed results writer."""
+
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from backend.utils.file_processor import FileProcessor
+
+@pytest.fixture
+def results_df() -> pd.DataFrame:
+    return pd.DataFrame({
+        "customer_id": ["c1", "c2", "c3"],
+        "recency": [3.5, 40.0, 120.25],
+        "frequency": [12, 3, 1],
+        "monetary": [980.5, 120.0, None],
+        "recency_score": [5, 3, 1],
+        "frequency_score": [5, 3, 1],
+        "monetary_score": [5, 2, 1],
+        "rfm_score": [15, 8, 3],
+        "segment": ["Champions", "Customers Who Need Attention", "Lost Customers"],
+    })
+
+@pytest.fixture
+def processor(tmp_path) -> FileProcessor:
+    return FileProcessor(str(tmp_path))
+
+@pytest.mark.parametrize("output_format, read", [
+    ("parquet", pd.read_parquet),
+    ("csv.gz", lambda path: pd.read_csv(path, compression="gzip")),
+])
+def test_round_trip(processor, results_df, tmp_path, output_format, read):
+    path = processor._write_results(results_df, str(tmp_path / "processed_data.csv"), output_format)
+
+    assert path == str(tmp_path / f"processed_data.{output_format}")
+    pd.testing.assert_frame_equal(read(path), results_df)
+
+def test_round_trip_xlsx(processor, results_df, tmp_path):
+    path = processor._write_results(results_df, str(tmp_path / "processed_data.csv.gz"), "xlsx")
+
+    assert path == str(tmp_path / "processed_data.xlsx")
+    rows = list(load_workbook(path, read_only=True)["Results"].values)
+    assert list(rows[0]) == list(results_df.columns)
+    expected = [
+        [None if pd.isna(value) else value for value in row]
+        for row in results_df.itertuples(index=False, name=None)
+    ]
+    assert [list(row) for row in rows[1:]] == expected
+    assert os.listdir(tmp_path) == ["processed_data.xlsx"]
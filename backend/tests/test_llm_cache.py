@@ -0,0 +1,23 @@
+"""Tests for the LLM response cache."""
+
+import asyncio
+
+from backend.utils.llm_cache import LLMResponseCache
+
+def test_prompts_differing_only_in_case_miss_each_other():
+    cache = LLMResponseCache()
+    upper = cache.make_key("gpt", "system", "Mensagem para ACME, tom formal", 0.7, 500)
+    mixed = cache.make_key("gpt", "system", "Mensagem para Acme, tom formal", 0.7, 500)
+    assert upper != mixed
+
+    async def run():
+        await cache.set(upper, "Olá, cliente ACME")
+        assert await cache.get(mixed) is None
+        assert await cache.get(upper) == "Olá, cliente ACME"
+
+    asyncio.run(run())
+
+def test_whitespace_differences_share_a_key():
+    cache = LLMResponseCache()
+    assert cache.make_key("gpt", "system", "Mensagem  para\nAcme ", 0.7, 500) == \
+        cache.make_key("gpt", "system", "Mensagem para Acme", 0.7, 500)
@@ -0,0 +1,68 @@
+"""Tests for the LLM gateway."""
+
+import json
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI
+
+from backend.utils.llm_gateway import LLMGateway
+
+def _chunk(content: str) -> bytes:
+    payload = {
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "test-model",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+class EndlessStream(httpx.AsyncByteStream):
+    """Server-sent events that never finish, recording whether the response was closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        while True:
+            yield _chunk("token ")
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+def make_gateway(stream: EndlessStream) -> LLMGateway:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=stream)
+
+    gateway = LLMGateway(api_key="test", max_concurrency=2, max_retries=1)
+    gateway._client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://llm.test/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    return gateway
+
+def test_stream_closed_early_releases_the_connection():
+    upstream = EndlessStream()
+    gateway = make_gateway(upstream)
+
+    async def consume_one_delta():
+        deltas = gateway.stream(
+            messages=[{"role": "user", "content": "hello"}],
+            model="test-model",
+            max_tokens=50,
+            temperature=0.7
+        )
+        async for delta in deltas:
+            assert delta == "token "
+            break
+        # What happens when the SSE client disconnects or a producer task is cancelled
+        await deltas.aclose()
+
+        # Checked before the event loop shuts down, which would finalize the response anyway
+        assert upstream.closed
+        assert gateway.semaphore._value == gateway.max_concurrency
+
+    asyncio.run(consume_one_delta())
@@ -0,0 +1,88 @@
+"""Tests for the token budget scheduler."""
+
+import asyncio
+
+import pytest
+
+from backend.utils.llm_scheduler import RateLimitExceeded, TokenBudgetScheduler
+
+def test_users_are_served_round_robin():
+    async def run():
+        # Budget for a single 100-token request at a time, refilled by settle()
+        scheduler = TokenBudgetScheduler(100, 1000, max_wait_seconds=600)
+        await scheduler.acquire("holder", 100)
+
+        order = []
+
+        async def request(user_id, name):
+            await scheduler.acquire(user_id, 100)
+            order.append(name)
+
+        # Alice queues three requests before Bob queues his two
+        tasks = [asyncio.create_task(request(user_id, name)) for user_id, name in [
+            ("alice", "a1"), ("alice", "a2"), ("alice", "a3"), ("bob", "b1"), ("bob", "b2")
+        ]]
+        await asyncio.sleep(0)
+        for _ in tasks:
+            scheduler.settle(100, 0)
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["a1", "b1", "a2", "b2", "a3"]
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        scheduler = TokenBudgetScheduler(100, 1000, max_wait_seconds=600)
+        await scheduler.acquire("holder", 100)
+
+        waiter = asyncio.create_task(scheduler.acquire("alice", 100))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert scheduler._queued_tokens == 0
+        assert scheduler._queued_requests == 0
+        assert not scheduler._queues
+
+    asyncio.run(run())
+
+def test_grant_is_refunded_when_cancelled_before_resuming():
+    async def run():
+        scheduler = TokenBudgetScheduler(1000, 100, max_wait_seconds=600)
+        await scheduler.acquire("holder", 1000)
+
+        waiter = asyncio.create_task(scheduler.acquire("alice", 500))
+        await asyncio.sleep(0)
+        # The grant and the cancellation land before the waiter runs again
+        scheduler.settle(1000, 0)
+        assert not scheduler._queues and round(scheduler._tokens) == 500
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        # Only the holder's request is charged
+        assert round(scheduler._tokens) == 1000
+        assert round(scheduler._requests) == 99
+
+    asyncio.run(run())
+
+def test_pause_rejects_requests_that_would_wait_too_long():
+    async def run():
+        scheduler = TokenBudgetScheduler(1000, 100, max_wait_seconds=5)
+        scheduler.pause(30)
+        with pytest.raises(RateLimitExceeded) as error:
+            await scheduler.acquire("alice", 10)
+        assert error.value.retry_after >= 29
+
+    asyncio.run(run())
+
+def test_settle_returns_unused_tokens():
+    async def run():
+        scheduler = TokenBudgetScheduler(1000, 100)
+        reserved = await scheduler.acquire("alice", 600)
+        scheduler.settle(reserved, 200)
+        assert round(scheduler._tokens) == 800
+
+    asyncio.run(run())
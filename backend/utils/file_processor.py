@@ -6,9 +6,20 @@ from typing import Dict, Any, Tuple, List
 import os
 from datetime import datetime
 import json
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from ..models import RFMAnalysis, CustomerRecord
+from openpyxl import Workbook
+
+from ..models import RFMAnalysis, CustomerRecord, SegmentSummary, AIInsight
+from ..database import create_customer_records_partition, drop_customer_records_partition
+
+# Supported formats for the processed results file and their extensions
+OUTPUT_FORMATS = {
+    "xlsx": ".xlsx",
+    "parquet": ".parquet",
+    "csv.gz": ".csv.gz",
+}
 
 class FileProcessor:
     def __init__(self, upload_dir: str):
@@ -50,7 +61,8 @@ class FileProcessor:
         db: Session,
         analysis: RFMAnalysis,
         df: pd.DataFrame,
-        column_mapping: Dict[str, str]
+        column_mapping: Dict[str, str],
+        output_format: str = "xlsx"
     ) -> None:
         """Perform RFM analysis and save results.
         
@@ -59,13 +71,22 @@ class FileProcessor:
             analysis: RFMAnalysis instance
             df: DataFrame with customer data
             column_mapping: Mapping of DataFrame columns to RFM fields
+            output_format: Format of the processed file, one of OUTPUT_FORMATS,
+                chosen by the caller for each analysis. Parquet and CSV.gz are
+                much faster than XLSX for large files.
         """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+
         # Calculate RFM scores
         recency_col = column_mapping['recency']
         frequency_col = column_mapping['frequency']
         monetary_col = column_mapping['monetary']
         customer_id_col = column_mapping['customer_id']
 
+        # Customer records of each analysis live in their own partition
+        create_customer_records_partition(db, analysis.id)
+
         # Calculate quintiles for scoring
         r_labels = range(1, 6)
         # Note: For recency, lower values are better (more recent)
@@ -73,6 +94,14 @@ class FileProcessor:
         f_quintiles = pd.qcut(df[frequency_col], q=5, labels=r_labels)
         m_quintiles = pd.qcut(df[monetary_col], q=5, labels=r_labels)
 
+        r_scores = r_quintiles.astype(int)
+        f_scores = f_quintiles.astype(int)
+        m_scores = m_quintiles.astype(int)
+        segments = pd.Series(
+            [self._get_segment(r, f, m) for r, f, m in zip(r_scores, f_scores, m_scores)],
+            index=df.index
+        )
+
         # Create customer records
         for idx, row in df.iterrows():
             customer_record = CustomerRecord(
@@ -81,36 +110,112 @@ class FileProcessor:
                 recency_value=float(row[recency_col]),
                 frequency_value=int(row[frequency_col]),
                 monetary_value=float(row[monetary_col]),
-                recency_score=int(r_quintiles[idx]),
-                frequency_score=int(f_quintiles[idx]),
-                monetary_score=int(m_quintiles[idx]),
-                rfm_score=int(r_quintiles[idx] + f_quintiles[idx] + m_quintiles[idx]),
-                segment=self._get_segment(
-                    int(r_quintiles[idx]),
-                    int(f_quintiles[idx]),
-                    int(m_quintiles[idx])
-                ),
+                recency_score=int(r_scores[idx]),
+                frequency_score=int(f_scores[idx]),
+                monetary_score=int(m_scores[idx]),
+                rfm_score=int(r_scores[idx] + f_scores[idx] + m_scores[idx]),
+                segment=segments[idx],
                 original_data=row.to_dict()
             )
             db.add(customer_record)
 
-        # Save processed file with results
-        results_df = df.copy()
-        results_df['recency_score'] = r_quintiles
-        results_df['frequency_score'] = f_quintiles
-        results_df['monetary_score'] = m_quintiles
-        results_df['rfm_score'] = results_df['recency_score'] + results_df['frequency_score'] + results_df['monetary_score']
-        results_df['segment'] = results_df.apply(
-            lambda x: self._get_segment(
-                int(x['recency_score']),
-                int(x['frequency_score']),
-                int(x['monetary_score'])
-            ),
-            axis=1
+        # Materialize per-segment aggregates in the same transaction as the customer rows
+        scores = pd.DataFrame({
+            'segment': segments,
+            'recency_score': r_scores,
+            'frequency_score': f_scores,
+            'monetary_score': m_scores,
+            'recency_value': df[recency_col].astype(float),
+            'frequency_value': df[frequency_col].astype(float),
+            'monetary_value': df[monetary_col].astype(float),
+        })
+        for optional_col in ('churn_probability', 'predicted_ltv'):
+            if optional_col in df.columns:
+                scores[optional_col] = df[optional_col].astype(float)
+        db.add_all(self._build_segment_summaries(analysis.id, scores))
+
+        # Save processed file with results, reusing the scores and segments computed above
+        results_df = df.assign(
+            recency_score=r_scores,
+            frequency_score=f_scores,
+            monetary_score=m_scores,
+            rfm_score=r_scores + f_scores + m_scores,
+            segment=segments
+        )
+        analysis.processed_file_path = self._write_results(
+            results_df, analysis.processed_file_path, output_format
         )
 
-        # Save to processed file path
-        results_df.to_excel(analysis.processed_file_path, index=False)
+    def _write_results(self, results_df: pd.DataFrame, path: str, output_format: str) -> str:
+        """Write the processed results file.
+        
+        XLSX is streamed row by row through a write-only workbook, so memory
+        stays constant instead of building the whole sheet in openpyxl.
+        
+        Args:
+            results_df: DataFrame with customer data, scores and segments
+            path: Requested output path; its extension is replaced to match the format
+            output_format: One of OUTPUT_FORMATS
+            
+        Returns:
+            Path of the written file
+        """
+        base_path = path[:-len(".csv.gz")] if path.endswith(".csv.gz") else os.path.splitext(path)[0]
+        output_path = base_path + OUTPUT_FORMATS[output_format]
+
+        if output_format == "parquet":
+            results_df.to_parquet(output_path, index=False)
+        elif output_format == "csv.gz":
+            results_df.to_csv(output_path, index=False, compression="gzip")
+        else:
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet("Results")
+            sheet.append([str(col) for col in results_df.columns])
+            for row in results_df.itertuples(index=False, name=None):
+                sheet.append([None if pd.isna(value) else value for value in row])
+            workbook.save(output_path)
+
+        return output_path
+
+    def _build_segment_summaries(self, analysis_id: str, scores: pd.DataFrame) -> List[SegmentSummary]:
+        """Aggregate per-customer scores into one SegmentSummary per segment.
+        
+        Args:
+            analysis_id: ID of the analysis
+            scores: DataFrame with segment, score and value columns per customer,
+                plus optional churn_probability and predicted_ltv columns
+            
+        Returns:
+            List of SegmentSummary instances (not yet added to the session)
+        """
+        grouped = scores.groupby('segment')
+        counts = grouped.size()
+        sums = grouped.sum()
+        means = grouped.mean()
+        has_churn = 'churn_probability' in scores.columns
+        has_ltv = 'predicted_ltv' in scores.columns
+
+        summaries = []
+        for segment, count in counts.items():
+            summaries.append(SegmentSummary(
+                analysis_id=analysis_id,
+                segment=segment,
+                customer_count=int(count),
+                recency_score_sum=int(sums.at[segment, 'recency_score']),
+                frequency_score_sum=int(sums.at[segment, 'frequency_score']),
+                monetary_score_sum=int(sums.at[segment, 'monetary_score']),
+                recency_score_avg=float(means.at[segment, 'recency_score']),
+                frequency_score_avg=float(means.at[segment, 'frequency_score']),
+                monetary_score_avg=float(means.at[segment, 'monetary_score']),
+                recency_value_avg=float(means.at[segment, 'recency_value']),
+                frequency_value_avg=float(means.at[segment, 'frequency_value']),
+                monetary_value_sum=float(sums.at[segment, 'monetary_value']),
+                monetary_value_avg=float(means.at[segment, 'monetary_value']),
+                churn_probability_avg=float(means.at[segment, 'churn_probability']) if has_churn else None,
+                predicted_ltv_sum=float(sums.at[segment, 'predicted_ltv']) if has_ltv else None,
+                predicted_ltv_avg=float(means.at[segment, 'predicted_ltv']) if has_ltv else None
+            ))
+        return summaries
 
     def _get_segment(self, r_score: int, f_score: int, m_score: int) -> str:
         """Determine customer segment based on RFM scores.
@@ -180,22 +285,77 @@ class FileProcessor:
         Returns:
             Dictionary with analysis summary
         """
-        records = db.query(CustomerRecord).filter(
-            CustomerRecord.analysis_id == analysis_id
+        summaries = db.query(SegmentSummary).filter(
+            SegmentSummary.analysis_id == analysis_id
         ).all()
+        if summaries:
+            rows = [
+                (summary.segment, summary.customer_count, summary.recency_score_sum,
+                 summary.frequency_score_sum, summary.monetary_score_sum)
+                for summary in summaries
+            ]
+        else:
+            # Analyses saved before segment summaries existed: aggregate in the database,
+            # one row per segment instead of one ORM object per customer
+            rows = db.query(
+                CustomerRecord.segment,
+                func.count(CustomerRecord.id),
+                func.sum(CustomerRecord.recency_score),
+                func.sum(CustomerRecord.frequency_score),
+                func.sum(CustomerRecord.monetary_score)
+            ).filter(
+                CustomerRecord.analysis_id == analysis_id
+            ).group_by(CustomerRecord.segment).all()
 
         segments = {}
-        for record in records:
-            if record.segment not in segments:
-                segments[record.segment] = 0
-            segments[record.segment] += 1
+        total = recency_sum = frequency_sum = monetary_sum = 0
+        for segment, count, recency, frequency, monetary in rows:
+            segments[segment] = count
+            total += count
+            recency_sum += recency or 0
+            frequency_sum += frequency or 0
+            monetary_sum += monetary or 0
 
         return {
-            "total_customers": len(records),
+            "total_customers": total,
             "segment_distribution": segments,
             "average_scores": {
-                "recency": sum(r.recency_score for r in records) / len(records),
-                "frequency": sum(r.frequency_score for r in records) / len(records),
-                "monetary": sum(r.monetary_score for r in records) / len(records),
+                "recency": recency_sum / total if total else 0.0,
+                "frequency": frequency_sum / total if total else 0.0,
+                "monetary": monetary_sum / total if total else 0.0,
             }
-        } 
\ No newline at end of file
+        }
+
+    def delete_analysis(self, db: Session, analysis_id: str) -> None:
+        """Delete an analysis together with its customer records, summaries and insights.
+        
+        Customer records are removed by dropping the analysis partition
+        instead of deleting them row by row.
+        
+        Args:
+            db: Database session
+            analysis_id: ID of the analysis
+        """
+        drop_customer_records_partition(db, analysis_id)
+        db.query(SegmentSummary).filter(SegmentSummary.analysis_id == analysis_id).delete(synchronize_session=False)
+        db.query(AIInsight).filter(AIInsight.analysis_id == analysis_id).delete(synchronize_session=False)
+        db.query(RFMAnalysis).filter(RFMAnalysis.id == analysis_id).delete(synchronize_session=False)
+
+    def delete_analyses_before(self, db: Session, cutoff: datetime) -> List[str]:
+        """Delete every analysis run before a given date (retention).
+        
+        Args:
+            db: Database session
+            cutoff: Analyses with an earlier analysis_date are deleted
+            
+        Returns:
+            List of deleted analysis IDs
+        """
+        analysis_ids = [
+            analysis_id for (analysis_id,) in db.query(RFMAnalysis.id).filter(
+                RFMAnalysis.analysis_date < cutoff
+            )
+        ]
+        for analysis_id in analysis_ids:
+            self.delete_analysis(db, analysis_id)
+        return analysis_ids
@@ -0,0 +1,218 @@
+"""Response cache for LLM calls."""
+
+import os
+import re
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import Counter
+
+    CACHE_REQUESTS = Counter(
+        "llm_cache_requests_total",
+        "LLM response cache lookups",
+        ["tier", "result"]
+    )
+except ImportError:
+    CACHE_REQUESTS = None
+
+_WHITESPACE = re.compile(r"\s+")
+
+def _normalize(text: str) -> str:
+    """Normalize prompt whitespace so trivially different prompts share a key.
+
+    Case is kept: prompts carry names such as the company name, and a response
+    written for "ACME" must not be served for "Acme".
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE.sub(" ", text).strip()
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        ttl_seconds: int = 86400,
+        max_entries: int = 1024,
+        sqlite_path: Optional[str] = None,
+        temperature_step: float = 0.1,
+        purge_interval_seconds: int = 300,
+        enabled: bool = True
+    ):
+        """Initialize the cache.
+
+        Args:
+            ttl_seconds: Lifetime of cached responses
+            max_entries: Capacity of the in-process LRU tier
+            sqlite_path: Optional SQLite file shared by all workers of a host
+            temperature_step: Width of the temperature buckets used in keys
+            purge_interval_seconds: Minimum time between purges of expired rows from the shared tier
+            enabled: When False, lookups always miss and nothing is stored
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.sqlite_path = sqlite_path
+        self.temperature_step = temperature_step
+        self.purge_interval_seconds = purge_interval_seconds
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+        if enabled and sqlite_path:
+            os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    " key TEXT PRIMARY KEY,"
+                    " expires_at REAL NOT NULL,"
+                    " response TEXT NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at)")
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        """Build a cache from LLM_CACHE_* environment variables."""
+        return cls(
+            ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+            sqlite_path=os.getenv("LLM_CACHE_SQLITE_PATH") or None,
+            purge_interval_seconds=int(os.getenv("LLM_CACHE_PURGE_INTERVAL_SECONDS", "300")),
+            enabled=os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.sqlite_path, timeout=5)
+
+    def make_key(
+        self,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Build a cache key from normalized request parameters.
+
+        Args:
+            model: Model name
+            system_prompt: System message
+            user_prompt: User message
+            temperature: Sampling temperature, bucketed by temperature_step
+            max_tokens: Response token limit
+
+        Returns:
+            Hex digest identifying the request
+        """
+        temperature_bucket = round(temperature / self.temperature_step)
+        material = json.dumps(
+            [model, _normalize(system_prompt), _normalize(user_prompt), temperature_bucket, max_tokens]
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _record(self, tier: str, result: str) -> None:
+        if CACHE_REQUESTS is not None:
+            CACHE_REQUESTS.labels(tier=tier, result=result).inc()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up a cached response, first in process memory, then in the shared tier.
+
+        The shared tier is queried on a worker thread, so a locked SQLite file
+        never blocks the event loop.
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            Cached response text, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._record("memory", "hit")
+                    return entry[1]
+                del self._memory[key]
+        self._record("memory", "miss")
+
+        if not self.sqlite_path:
+            return None
+
+        row = await asyncio.to_thread(self._shared_get, key, now)
+        if row is None:
+            self._record("shared", "miss")
+            return None
+        self._remember(key, row[0], row[1])
+        self._record("shared", "hit")
+        return row[1]
+
+    async def set(self, key: str, response: str) -> None:
+        """Store a response in every tier.
+
+        Args:
+            key: Key from make_key
+            response: Response text
+        """
+        if not self.enabled:
+            return
+
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, expires_at, response)
+
+        if self.sqlite_path:
+            await asyncio.to_thread(self._shared_set, key, expires_at, response)
+
+    def _shared_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        """Read an unexpired entry from the shared tier (blocking)."""
+        try:
+            with self._connect() as conn:
+                return conn.execute(
+                    "SELECT expires_at, response FROM llm_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache shared tier unavailable: {str(e)}")
+            return None
+
+    def _shared_set(self, key: str, expires_at: float, response: str) -> None:
+        """Write an entry to the shared tier, purging expired rows now and then (blocking)."""
+        now = time.time()
+        with self._lock:
+            purge = now >= self._next_purge
+            if purge:
+                self._next_purge = now + self.purge_interval_seconds
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, expires_at, response) VALUES (?, ?, ?)",
+                    (key, expires_at, response)
+                )
+                if purge:
+                    conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache shared tier unavailable: {str(e)}")
+
+    def _remember(self, key: str, expires_at: float, response: str) -> None:
+        """Store an entry in the in-process LRU tier."""
+        with self._lock:
+            self._memory[key] = (expires_at, response)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+# Shared cache instance configured from the environment
+llm_cache = LLMResponseCache.from_env()
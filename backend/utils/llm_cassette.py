@@ -0,0 +1,88 @@
+"""Record/replay of LLM responses for reproducible offline runs."""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when a request was never recorded."""
+
+class LLMCassette:
+    def __init__(self, path: str, mode: str = "off"):
+        """Initialize the cassette.
+
+        Recorded responses are appended to a JSON Lines file, one request per line.
+
+        Args:
+            path: Cassette file
+            mode: "off", "record" (store every response) or "replay" (answer only from the file)
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self._responses: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        if mode != "off" and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._responses[record["key"]] = record["response"]
+            logger.info(f"Loaded {len(self._responses)} recorded LLM responses from {path}")
+
+    @classmethod
+    def from_env(cls) -> "LLMCassette":
+        """Build a cassette from LLM_CASSETTE_* environment variables."""
+        return cls(
+            path=os.getenv("LLM_CASSETTE_PATH", "llm_cassette.jsonl"),
+            mode=os.getenv("LLM_CASSETTE_MODE", "off").lower()
+        )
+
+    @staticmethod
+    def make_key(params: Dict[str, Any]) -> str:
+        """Build the key of a chat completion request from its parameters."""
+        material = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def replay(self, key: str) -> str:
+        """Get a recorded response.
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            Recorded response text
+
+        Raises:
+            CassetteMiss: If the request was never recorded
+        """
+        response = self._responses.get(key)
+        if response is None:
+            raise CassetteMiss(f"No recorded LLM response for request {key[:12]} in {self.path}")
+        return response
+
+    def record(self, key: str, params: Dict[str, Any], response: str) -> None:
+        """Append a response to the cassette.
+
+        Args:
+            key: Key from make_key
+            params: Request parameters, stored for readability
+            response: Response text
+        """
+        line = json.dumps({"key": key, "request": params, "response": response}, ensure_ascii=False)
+        with self._lock:
+            self._responses[key] = response
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
@@ -0,0 +1,399 @@
+"""Async gateway for every LLM call made by the application."""
+
+import os
+import re
+import math
+import time
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Dict, Hashable, List, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from .llm_cassette import LLMCassette
+from .llm_scheduler import RateLimitExceeded, TokenBudgetScheduler, estimate_prompt_tokens, estimate_text_tokens
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised when the LLM provider is failing and calls are short-circuited."""
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        """Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_seconds: Time the circuit stays open before a trial call is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Get the breaker state: closed, open or half_open."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                return "open"
+            return "half_open"
+
+    def before_call(self) -> None:
+        """Check that a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with a trial call already running
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial_in_flight:
+                raise CircuitOpenError(f"LLM provider unavailable, retry in {max(math.ceil(remaining), 1)}s")
+            # Half open: let a single trial call through
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Allow a new trial call after one ended without an outcome (e.g. it was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit past the threshold."""
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning(f"Opening LLM circuit after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+def _is_retryable(error: BaseException) -> bool:
+    """Retry rate limits, timeouts, connection errors and 5xx responses."""
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _is_provider_failure(error: BaseException) -> bool:
+    """Failures that indicate the provider is unhealthy (rate limits do not trip the breaker)."""
+    return _is_retryable(error) and not isinstance(error, openai.RateLimitError)
+
+def _retry_after(error: openai.RateLimitError) -> float:
+    """Read the Retry-After header of an upstream 429, defaulting to one second."""
+    try:
+        return float(error.response.headers.get("retry-after", 1))
+    except (AttributeError, ValueError):
+        return 1.0
+
+class LLMGateway:
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        timeout_seconds: float = 60.0,
+        connect_timeout_seconds: float = 5.0,
+        max_connections: int = 20,
+        max_concurrency: int = 16,
+        max_retries: int = 4,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_seconds: float = 30.0,
+        scheduler: Optional[TokenBudgetScheduler] = None,
+        base_url: Optional[str] = None,
+        cassette: Optional[LLMCassette] = None
+    ):
+        """Initialize the gateway.
+
+        Args:
+            api_key: OpenAI API key
+            timeout_seconds: Read/write timeout of a request
+            connect_timeout_seconds: Connection timeout
+            max_connections: Size of the keep-alive connection pool
+            max_concurrency: Maximum number of in-flight LLM calls in this process
+            max_retries: Attempts per call, including the first one
+            breaker_failure_threshold: Consecutive provider failures that open the circuit
+            breaker_reset_seconds: Time the circuit stays open
+            scheduler: Token budget scheduler; calls are not budgeted when None
+            base_url: OpenAI-compatible endpoint, e.g. a local stub server (OpenAI when None)
+            cassette: Record/replay cassette for responses
+        """
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds)
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker(breaker_failure_threshold, breaker_reset_seconds)
+        self.scheduler = scheduler
+        self.base_url = base_url
+        self.cassette = cassette
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str] = None) -> "LLMGateway":
+        """Build a gateway from LLM_* environment variables."""
+        tokens_per_minute = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+        requests_per_minute = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+        scheduler = None
+        if tokens_per_minute > 0 and requests_per_minute > 0:
+            scheduler = TokenBudgetScheduler(
+                tokens_per_minute,
+                requests_per_minute,
+                max_wait_seconds=float(os.getenv("LLM_MAX_QUEUE_WAIT_SECONDS", "10"))
+            )
+        return cls(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", "60")),
+            connect_timeout_seconds=float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5")),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+            breaker_failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            breaker_reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+            scheduler=scheduler,
+            base_url=os.getenv("LLM_BASE_URL") or None,
+            cassette=LLMCassette.from_env()
+        )
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Get the pooled async client, created on first use."""
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+            # Retries are handled here, with jitter and the circuit breaker
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0,
+                http_client=http_client
+            )
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore bounding in-flight calls, created on first use."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _retrying(self) -> AsyncRetrying:
+        return AsyncRetrying(
+            stop=stop_after_attempt(self.max_retries),
+            wait=wait_random_exponential(multiplier=0.5, max=20),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True
+        )
+
+    async def _create(self, **params):
+        """Issue one chat completion request through the breaker."""
+        self.breaker.before_call()
+        try:
+            response = await self.client.chat.completions.create(**params)
+        except Exception as e:
+            if isinstance(e, openai.RateLimitError) and self.scheduler is not None:
+                # The quota is shared with other processes; hold everyone back
+                self.scheduler.pause(_retry_after(e))
+            if _is_provider_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            # Cancelled (e.g. the client disconnected): says nothing about the provider
+            self.breaker.release_trial()
+            raise
+        self.breaker.record_success()
+        return response
+
+    def _cassette_mode(self) -> str:
+        return self.cassette.mode if self.cassette is not None else "off"
+
+    async def _reserve(self, user_id: Hashable, tokens: int) -> int:
+        """Wait for token budget, if a scheduler is configured."""
+        if self.scheduler is None:
+            return 0
+        return await self.scheduler.acquire(user_id, tokens)
+
+    def _settle(self, reserved: int, used: int) -> None:
+        """Return unused reserved tokens to the budget."""
+        if self.scheduler is not None:
+            self.scheduler.settle(reserved, used)
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        user_id: Hashable = None
+    ) -> str:
+        """Run a chat completion, retrying transient failures with jittered backoff.
+
+        Args:
+            messages: Chat messages
+            model: Model name
+            max_tokens: Response token limit
+            temperature: Sampling temperature
+            user_id: User the call is made for, used for fair scheduling
+
+        Returns:
+            Generated text
+
+        Raises:
+            CircuitOpenError: If the provider is failing
+            RateLimitExceeded: If the token budget is exhausted
+        """
+        params = {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+        mode = self._cassette_mode()
+        if mode == "replay":
+            return self.cassette.replay(self.cassette.make_key(params))
+
+        prompt_tokens = estimate_prompt_tokens(messages, model)
+        try:
+            async for attempt in self._retrying():
+                with attempt:
+                    reserved = await self._reserve(user_id, prompt_tokens + max_tokens)
+                    # Every attempt settles its own reservation; failed ones are charged the prompt
+                    used = prompt_tokens
+                    try:
+                        async with self.semaphore:
+                            response = await self._create(
+                                model=model,
+                                messages=messages,
+                                max_tokens=max_tokens,
+                                n=1,
+                                temperature=temperature
+                            )
+                        usage = getattr(response, "usage", None)
+                        used = usage.total_tokens if usage else prompt_tokens + max_tokens
+                    finally:
+                        self._settle(reserved, used)
+        except openai.RateLimitError as e:
+            raise RateLimitExceeded(_retry_after(e)) from e
+
+        # Content is None when the model returns no text (e.g. a content filter stop)
+        content = response.choices[0].message.content or ""
+        if mode == "record":
+            self.cassette.record(self.cassette.make_key(params), params, content)
+        return content
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        user_id: Hashable = None
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion's text deltas.
+
+        Only opening the stream is retried; once tokens have been yielded,
+        errors are raised to the caller.
+
+        Args:
+            messages: Chat messages
+            model: Model name
+            max_tokens: Response token limit
+            temperature: Sampling temperature
+            user_id: User the call is made for, used for fair scheduling
+
+        Yields:
+            Generated text deltas
+
+        Raises:
+            CircuitOpenError: If the provider is failing
+            RateLimitExceeded: If the token budget is exhausted
+        """
+        params = {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+        mode = self._cassette_mode()
+        if mode == "replay":
+            # Replay word by word so clients still receive a stream
+            for delta in re.findall(r"\S+\s*|\s+", self.cassette.replay(self.cassette.make_key(params))):
+                yield delta
+            return
+
+        prompt_tokens = estimate_prompt_tokens(messages, model)
+        try:
+            async for attempt in self._retrying():
+                with attempt:
+                    reserved = await self._reserve(user_id, prompt_tokens + max_tokens)
+                    await self.semaphore.acquire()
+                    try:
+                        stream = await self._create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            n=1,
+                            temperature=temperature,
+                            stream=True
+                        )
+                    except BaseException:
+                        self.semaphore.release()
+                        # The stream never opened; settle this attempt's reservation now
+                        self._settle(reserved, prompt_tokens)
+                        raise
+        except openai.RateLimitError as e:
+            raise RateLimitExceeded(_retry_after(e)) from e
+
+        parts = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Return the pooled connection now, also when the caller stops early (e.g. client disconnect)
+            await stream.close()
+            self.semaphore.release()
+            # Streams carry no usage, so estimate it from the generated text
+            self._settle(reserved, prompt_tokens + estimate_text_tokens("".join(parts), model))
+
+        if mode == "record":
+            self.cassette.record(self.cassette.make_key(params), params, "".join(parts))
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections."""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+_gateways: Dict[Optional[str], LLMGateway] = {}
+_gateways_lock = threading.Lock()
+
+def get_llm_gateway(api_key: Optional[str] = None) -> LLMGateway:
+    """Get the shared gateway of an API key (the OPENAI_API_KEY one by default).
+
+    Args:
+        api_key: OpenAI API key
+
+    Returns:
+        Gateway shared by every caller using that key
+    """
+    key = api_key or os.getenv("OPENAI_API_KEY")
+    with _gateways_lock:
+        gateway = _gateways.get(key)
+        if gateway is None:
+            gateway = LLMGateway.from_env(api_key=key)
+            _gateways[key] = gateway
+    return gateway
@@ -0,0 +1,223 @@
+"""Token budget scheduling for LLM calls."""
+
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Deque, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens added by the chat format around each message, and once per request
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REQUEST = 3
+
+class RateLimitExceeded(Exception):
+    """Raised when an LLM call cannot be scheduled within the allowed wait."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"LLM rate limit reached, retry in {self.retry_after}s")
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def estimate_text_tokens(text: str, model: str) -> int:
+    """Estimate the number of tokens of a text.
+
+    Uses tiktoken when installed, otherwise a conservative character-based estimate.
+
+    Args:
+        text: Text to measure
+        model: Model name
+
+    Returns:
+        Estimated token count
+    """
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text))
+    # Roughly 4 characters per token in English, fewer in Portuguese
+    return math.ceil(len(text) / 3)
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    """Estimate the number of prompt tokens of a chat request.
+
+    Args:
+        messages: Chat messages
+        model: Model name
+
+    Returns:
+        Estimated token count
+    """
+    return TOKENS_PER_REQUEST + sum(
+        TOKENS_PER_MESSAGE + estimate_text_tokens(message["content"], model)
+        for message in messages
+    )
+
+class _Waiter:
+    __slots__ = ("user_id", "tokens", "future")
+
+    def __init__(self, user_id: Hashable, tokens: int, future: asyncio.Future):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.future = future
+
+class TokenBudgetScheduler:
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int, max_wait_seconds: float = 10.0):
+        """Initialize the scheduler.
+
+        Budgets refill continuously. They are tracked per process, so with several
+        workers each one should be given its share of the upstream quota.
+
+        Args:
+            tokens_per_minute: Token budget (prompt plus completion tokens)
+            requests_per_minute: Request budget
+            max_wait_seconds: Longest a caller may wait for budget before being rejected
+        """
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.max_wait_seconds = max_wait_seconds
+        self._tokens = float(tokens_per_minute)
+        self._requests = float(requests_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Pending callers per user; users are served round-robin in this order
+        self._queues: "OrderedDict[Hashable, Deque[_Waiter]]" = OrderedDict()
+        self._queued_tokens = 0
+        self._queued_requests = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        return now
+
+    def _seconds_until(self, tokens: float, requests: float, now: float) -> float:
+        """Seconds until the budget covers the given amounts."""
+        return max(
+            0.0,
+            (tokens - self._tokens) * 60 / self.tokens_per_minute,
+            (requests - self._requests) * 60 / self.requests_per_minute,
+            self._paused_until - now
+        )
+
+    async def acquire(self, user_id: Hashable, tokens: int) -> int:
+        """Wait for budget for one request, queued fairly against other users.
+
+        Args:
+            user_id: Key used for fair queueing
+            tokens: Estimated tokens of the request, completion included
+
+        Returns:
+            Tokens reserved, to be passed to settle
+
+        Raises:
+            RateLimitExceeded: If the budget will not cover the request within max_wait_seconds
+        """
+        # A request larger than the whole budget could never run otherwise
+        tokens = min(tokens, self.tokens_per_minute)
+
+        now = self._refill()
+        # Requests already queued are served first, so count them in the estimate
+        wait = self._seconds_until(self._queued_tokens + tokens, self._queued_requests + 1, now)
+        if wait > self.max_wait_seconds:
+            raise RateLimitExceeded(wait)
+
+        waiter = _Waiter(user_id, tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self._queued_tokens += tokens
+        self._queued_requests += 1
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Cancelled after the grant: the request will not run, so give its budget back
+                self._refund(tokens)
+            else:
+                self._remove(waiter)
+            raise
+        return tokens
+
+    def settle(self, reserved: int, used: int) -> None:
+        """Adjust the budget once the real usage of a request is known.
+
+        Args:
+            reserved: Tokens returned by acquire
+            used: Tokens the request actually consumed
+        """
+        self._refill()
+        self._tokens = min(self.tokens_per_minute, self._tokens + reserved - used)
+        self._dispatch()
+
+    def _refund(self, tokens: int) -> None:
+        """Return the budget of a granted request that never ran."""
+        self._refill()
+        self._tokens = min(self.tokens_per_minute, self._tokens + tokens)
+        self._requests = min(self.requests_per_minute, self._requests + 1)
+        self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        """Stop granting requests for a while, e.g. after an upstream 429.
+
+        Args:
+            seconds: Pause duration
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning(f"LLM scheduler paused for {seconds:.1f}s after an upstream rate limit")
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Drop a cancelled caller from the queue."""
+        queue = self._queues.get(waiter.user_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.user_id]
+        self._queued_tokens -= waiter.tokens
+        self._queued_requests -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant budget to queued callers, one user at a time in round-robin order."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        now = self._refill()
+        while self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            wait = self._seconds_until(waiter.tokens, 1, now)
+            if wait > 0:
+                # Wake up when the budget has refilled enough for the head of the queue
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+
+            queue.popleft()
+            self._queued_tokens -= waiter.tokens
+            self._queued_requests -= 1
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+
+            if not waiter.future.done():
+                self._tokens -= waiter.tokens
+                self._requests -= 1
+                waiter.future.set_result(None)
@@ -1,12 +1,14 @@
 """OpenAI integration for RFM insights and text generation."""
 
-import openai
 from typing import Dict, List, Any
 import os
+import asyncio
 from datetime import datetime
 import json
 import logging
 from .prompts import PromptTemplates
+from .llm_cache import llm_cache
+from .llm_gateway import get_llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +19,7 @@ class OpenAIClient:
         Args:
             api_key: OpenAI API key
         """
-        openai.api_key = api_key
+        self.gateway = get_llm_gateway(api_key)
         self.model = "gpt-4"  # Using GPT-4 for better analysis
 
     async def generate_segment_insights(
@@ -43,20 +45,76 @@ class OpenAIClient:
                 **segment_data
             )
 
-            response = await openai.ChatCompletion.acreate(
-                model=self.model,
+            system_prompt = PromptTemplates.get_system_prompt("analyst")
+
+            # Segments with the same metrics produce the same prompt, so reuse earlier answers
+            cache_key = llm_cache.make_key(self.model, system_prompt, prompt, 0.7, 500)
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            content = await self.gateway.complete(
                 messages=[
-                    {"role": "system", "content": PromptTemplates.get_system_prompt("analyst")},
+                    {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.7,
-                max_tokens=500
+                model=self.model,
+                max_tokens=500,
+                temperature=0.7
             )
-            return response.choices[0].message.content
+            await llm_cache.set(cache_key, content)
+            return content
         except Exception as e:
             logger.error(f"Error generating segment insights: {str(e)}")
             return "Unable to generate insights at this time."
 
+    async def generate_all_segment_insights(
+        self,
+        segment_stats: Dict[str, Dict[str, Any]],
+        max_concurrency: int = 12
+    ) -> Dict[str, str]:
+        """Generate insights for every segment of an analysis concurrently.
+        
+        Args:
+            segment_stats: Segment statistics from RFMAnalysis.get_segment_stats
+            max_concurrency: Maximum number of segments generated at once
+            
+        Returns:
+            Dictionary mapping each segment name to its insights text
+        """
+        total_customers = sum(stats["count"] for stats in segment_stats.values())
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def generate(segment_name: str, stats: Dict[str, Any]) -> str:
+            async with semaphore:
+                return await self.generate_segment_insights(
+                    self._segment_prompt_data(stats, total_customers),
+                    segment_name
+                )
+
+        insights = await asyncio.gather(*[
+            generate(segment_name, stats) for segment_name, stats in segment_stats.items()
+        ])
+        return dict(zip(segment_stats.keys(), insights))
+
+    def _segment_prompt_data(self, stats: Dict[str, Any], total_customers: int) -> Dict[str, Any]:
+        """Convert a segment's statistics into the segment prompt parameters."""
+        metrics = {
+            "customers": int(stats["count"]),
+            "avg_recency_days": round(float(stats["avg_recency"]), 1),
+            "avg_frequency": round(float(stats["avg_frequency"]), 2),
+            "avg_monetary": round(float(stats["avg_monetary"]), 2),
+            "total_monetary": round(float(stats["total_monetary"]), 2)
+        }
+        return {
+            "avg_recency": metrics["avg_recency_days"],
+            "avg_frequency": metrics["avg_frequency"],
+            "avg_monetary": metrics["avg_monetary"],
+            "size": metrics["customers"],
+            "percentage": round(100 * metrics["customers"] / total_customers, 1) if total_customers else 0,
+            "metrics": json.dumps(metrics, indent=2)
+        }
+
     async def generate_marketing_suggestions(
         self,
         segment_name: str,
@@ -80,17 +138,17 @@ class OpenAIClient:
                 metrics=json.dumps(segment_metrics, indent=2)
             )
 
-            response = await openai.ChatCompletion.acreate(
-                model=self.model,
+            content = await self.gateway.complete(
                 messages=[
                     {"role": "system", "content": PromptTemplates.get_system_prompt("marketer")},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.8,
-                max_tokens=800
+                model=self.model,
+                max_tokens=800,
+                temperature=0.8
             )
             
-            suggestions = self._parse_marketing_suggestions(response.choices[0].message.content)
+            suggestions = self._parse_marketing_suggestions(content)
             return suggestions
         except Exception as e:
             logger.error(f"Error generating marketing suggestions: {str(e)}")
@@ -117,16 +175,16 @@ class OpenAIClient:
         try:
             prompt = PromptTemplates.get_marketplace_prompt(content_type, **kwargs)
             
-            response = await openai.ChatCompletion.acreate(
-                model=self.model,
+            content = await self.gateway.complete(
                 messages=[
                     {"role": "system", "content": PromptTemplates.get_system_prompt("copywriter")},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.8,
-                max_tokens=1000
+                model=self.model,
+                max_tokens=1000,
+                temperature=0.8
             )
-            return response.choices[0].message.content
+            return content
         except Exception as e:
             logger.error(f"Error generating marketplace content: {str(e)}")
             return "Unable to generate content at this time."
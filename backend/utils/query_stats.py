@@ -0,0 +1,200 @@
+"""Engine-level SQL statement timing, N+1 detection and slow-query capture."""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter, deque
+from contextvars import ContextVar, Token
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\([^)]*\)s|%s|:\w+|\$\d+|\?")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_TABLE = re.compile(r"\b(?:from|into|update|join)\s+\"?([\w.]+)", re.IGNORECASE)
+
+# Executions of each statement during the current request
+_request_statements: ContextVar[Optional[Counter]] = ContextVar("request_statements", default=None)
+
+class StatementInfo(NamedTuple):
+    """Normalized form of a SQL statement."""
+
+    fingerprint: str
+    statement: str
+    query_type: str
+    table: str
+
+@lru_cache(maxsize=4096)
+def describe_statement(statement: str) -> StatementInfo:
+    """Normalize a SQL statement and fingerprint it.
+
+    Literals and bind placeholders become "?" and value lists collapse to "(?)",
+    so every execution of the same query shape shares one fingerprint. ORM
+    statements use bound parameters, so their text repeats and the cache hits.
+
+    Args:
+        statement: SQL text as sent to the driver
+
+    Returns:
+        Fingerprint, normalized text, statement type and first table
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _VALUE_LIST.sub("(?)", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+
+    query_type = normalized.split(" ", 1)[0].upper() if normalized else "UNKNOWN"
+    table = _TABLE.search(normalized)
+    fingerprint = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+    return StatementInfo(fingerprint, normalized, query_type, table.group(1).lower() if table else "unknown")
+
+class QueryStats:
+    def __init__(self, slow_threshold: float = 0.5, slow_buffer_size: int = 100, max_fingerprints: int = 500):
+        """Initialize query statistics.
+
+        Args:
+            slow_threshold: Seconds from which an execution is kept as a slow query
+            slow_buffer_size: Number of most recent slow executions kept
+            max_fingerprints: Distinct fingerprints reported to observers; later ones are reported as "other"
+        """
+        self.slow_threshold = slow_threshold
+        self.max_fingerprints = max_fingerprints
+        self.slow_queries: Deque[Dict[str, Any]] = deque(maxlen=slow_buffer_size)
+        self._observers: List[Callable[[str, StatementInfo, float], None]] = []
+        self._fingerprints = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "QueryStats":
+        """Build query statistics from environment variables."""
+        return cls(
+            slow_threshold=float(os.getenv("THRESHOLD_DATABASE_QUERY_TIME", "0.5")),
+            slow_buffer_size=int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "100")),
+            max_fingerprints=int(os.getenv("QUERY_MAX_FINGERPRINTS", "500"))
+        )
+
+    def instrument(self, engine, name: str) -> None:
+        """Time every statement an engine executes.
+
+        Args:
+            engine: SQLAlchemy engine
+            name: Engine name reported with each statement
+        """
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._make_after_cursor_execute(name))
+
+    def add_observer(self, observer: Callable[[str, StatementInfo, float], None]) -> None:
+        """Register a callback receiving (engine name, statement info, seconds) for every execution.
+
+        Args:
+            observer: Callback; it runs on the thread executing the statement and must be fast
+        """
+        self._observers.append(observer)
+
+    def start_request(self) -> Token:
+        """Start counting the statements of a request.
+
+        Returns:
+            Token to pass to finish_request
+        """
+        return _request_statements.set(Counter())
+
+    def finish_request(self, token: Token) -> Counter:
+        """Stop counting the statements of a request.
+
+        Args:
+            token: Token from start_request
+
+        Returns:
+            Number of executions per statement (StatementInfo)
+        """
+        counts = _request_statements.get() or Counter()
+        _request_statements.reset(token)
+        return counts
+
+    def slowest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get the slowest recent statements, one entry per fingerprint.
+
+        Args:
+            limit: Maximum number of entries
+
+        Returns:
+            Slow query entries, slowest first
+        """
+        slowest: Dict[str, Dict[str, Any]] = {}
+        for entry in list(self.slow_queries):
+            kept = slowest.get(entry["fingerprint"])
+            if kept is None:
+                slowest[entry["fingerprint"]] = dict(entry, count=1)
+            else:
+                kept["count"] += 1
+                if entry["duration_ms"] > kept["duration_ms"]:
+                    kept.update(entry, count=kept["count"])
+        return sorted(slowest.values(), key=lambda entry: entry["duration_ms"], reverse=True)[:limit]
+
+    def _label(self, fingerprint: str) -> str:
+        """Bound the number of fingerprints reported to observers."""
+        if fingerprint in self._fingerprints:
+            return fingerprint
+        with self._lock:
+            if len(self._fingerprints) < self.max_fingerprints:
+                self._fingerprints.add(fingerprint)
+                return fingerprint
+        return "other"
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, which is discarded with the statement even when it fails
+        if context is not None:
+            context._query_start_time = time.perf_counter()
+
+    def _make_after_cursor_execute(self, name: str) -> Callable:
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, "_query_start_time", None)
+            if start is None:
+                return
+            duration = time.perf_counter() - start
+            try:
+                self._record(name, statement, duration, executemany)
+            except Exception as e:
+                logger.error(f"Failed to record query statistics: {e}")
+
+        return after_cursor_execute
+
+    def _record(self, name: str, statement: str, duration: float, executemany: bool) -> None:
+        """Count an execution for the request and report it."""
+        info = describe_statement(statement)
+
+        counts = _request_statements.get()
+        if counts is not None:
+            counts[info] += 1
+
+        if duration >= self.slow_threshold:
+            # Normalized text only, so bound values (user data) are never kept
+            self.slow_queries.append({
+                "engine": name,
+                "fingerprint": info.fingerprint,
+                "statement": info.statement,
+                "query_type": info.query_type,
+                "table": info.table,
+                "duration_ms": round(duration * 1000, 2),
+                "executemany": executemany,
+                "timestamp": time.time()
+            })
+
+        if self._observers:
+            reported = info if self._label(info.fingerprint) == info.fingerprint else info._replace(fingerprint="other")
+            for observer in self._observers:
+                observer(name, reported, duration)
+
+query_stats = QueryStats.from_env()
@@ -61,8 +61,35 @@ MESSAGE_LIMITS = {
 
 MAX_REGENERATION_ATTEMPTS = 3
 MAX_MESSAGES_PER_GENERATION = 5
+MAX_CONCURRENT_LLM_CALLS_PER_USER = int(os.getenv("MAX_CONCURRENT_LLM_CALLS_PER_USER", "5"))
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+# Per process: N API workers sharing the PDF directory may use up to N times this on disk
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
 MESSAGE_HISTORY_DAYS = 7
 
+# Request Body Limits (bytes), enforced while the body streams in
+REQUEST_BODY_MAX_BYTES = int(os.getenv("REQUEST_BODY_MAX_BYTES", str(10 * 1024 * 1024)))
+# Larger limits for specific routes, keyed by path prefix below the versioned API prefix
+# (the middleware prepends get_api_prefix(), as it does for the auth endpoints)
+REQUEST_BODY_ROUTE_LIMITS = {
+    "/rfm/analyze-rfm": int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+}
+
+# Rate Limiting Configuration
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, shared or redis
+RATE_LIMIT_BACKEND_OPTIONS = {
+    "memory": {
+        "max_keys": int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    },
+    "shared": {
+        "path": os.getenv("RATE_LIMIT_SHM_PATH", "/dev/shm/rfm_rate_limit"),
+        "slots": int(os.getenv("RATE_LIMIT_SHM_SLOTS", "65536"))
+    },
+    "redis": {
+        "url": os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    }
+}
+
 # Message Generation Prompts
 PROMPT_TEMPLATES = {
     "sms": "Gere uma mensagem SMS promocional em português do Brasil, limitada a {limit} caracteres, para {segment} com objetivo de {objective}. Tom: {tone}. Empresa: {company}.",
@@ -24,6 +24,23 @@ GRAFANA_URL = os.getenv("GRAFANA_URL", "http://grafana:3000")
 ALERT_EMAIL_RECIPIENTS = os.getenv("ALERT_EMAIL_RECIPIENTS", "").split(",")
 ALERT_SLACK_WEBHOOK = os.getenv("ALERT_SLACK_WEBHOOK", "")
 ALERT_CRITICAL_THRESHOLD = int(os.getenv("ALERT_CRITICAL_THRESHOLD", "3"))
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))  # pending alerts; warnings are dropped past half
+ALERT_DEDUP_SECONDS = float(os.getenv("ALERT_DEDUP_SECONDS", "300"))  # minimum interval between alerts with the same key
+ALERT_DIGEST_INTERVAL = float(os.getenv("ALERT_DIGEST_INTERVAL", "30"))  # seconds alerts are collected into one digest
+ALERT_HTTP_TIMEOUT = float(os.getenv("ALERT_HTTP_TIMEOUT", "5"))  # seconds
+
+# System Resource Sampling
+RESOURCE_SAMPLE_INTERVAL = float(os.getenv("RESOURCE_SAMPLE_INTERVAL", "15"))  # seconds between samples
+
+# Query Monitoring
+# A request running the same SELECT this many times is reported as a likely N+1 query
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+# Analysis Profiling
+# Diagnostic switch, keep off in production: peak memory per stage is measured with
+# tracemalloc, which traces the whole process and slows down every allocation, and its
+# process-wide peak is reset per stage, so overlapping analyses skew each other's peaks
+ANALYSIS_TRACK_MEMORY = os.getenv("ANALYSIS_TRACK_MEMORY", "False").lower() == "true"
 
 # Performance Thresholds
 PERFORMANCE_THRESHOLDS = {
@@ -65,6 +82,17 @@ METRICS = {
         "labels": ["query_type", "table"],
         "buckets": [0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0]
     },
+    "database_statement_duration_seconds": {
+        "type": "histogram",
+        "description": "Database statement duration in seconds by normalized statement fingerprint",
+        "labels": ["engine", "fingerprint"],
+        "buckets": [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+    },
+    "database_n_plus_one_total": {
+        "type": "counter",
+        "description": "Requests repeating one SELECT at least N_PLUS_ONE_THRESHOLD times",
+        "labels": ["endpoint"]
+    },
     "active_users": {
         "type": "gauge",
         "description": "Number of active users",
@@ -76,6 +104,12 @@ METRICS = {
         "labels": ["dataset_size", "analysis_type"],
         "buckets": [0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0]
     },
+    "rfm_analysis_peak_memory_bytes": {
+        "type": "histogram",
+        "description": "Peak memory allocated during an RFM analysis stage in bytes",
+        "labels": ["dataset_size", "analysis_type"],
+        "buckets": [1e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9, 2e9]
+    },
     "memory_usage_bytes": {
         "type": "gauge",
         "description": "Memory usage in bytes",
@@ -85,5 +119,30 @@ METRICS = {
         "type": "gauge",
         "description": "CPU usage percentage",
         "labels": ["service"]
+    },
+    "memory_rss_bytes": {
+        "type": "gauge",
+        "description": "Resident memory of the service process in bytes",
+        "labels": ["service"]
+    },
+    "open_fds": {
+        "type": "gauge",
+        "description": "Open file descriptors of the service process",
+        "labels": ["service"]
+    },
+    "event_loop_lag_seconds": {
+        "type": "gauge",
+        "description": "Delay before the event loop runs a scheduled callback",
+        "labels": ["service"]
+    },
+    "thread_pool_queue_depth": {
+        "type": "gauge",
+        "description": "Tasks waiting for a worker thread",
+        "labels": ["pool"]
+    },
+    "db_pool_connections": {
+        "type": "gauge",
+        "description": "Database pool connections by state",
+        "labels": ["pool", "state"]
     }
 }
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Benchmark of the per-request middleware overhead.
+
+Compares three stacks in front of a no-op ASGI app:
+    legacy    three middlewares, each building a Request object to read headers
+    stacked   the current RequestValidator, RateLimiter and MonitoringMiddleware, layered
+    pipeline  RequestPipelineMiddleware, the single combined stage used by the API
+
+Usage:
+    python scripts/benchmark_middleware.py --requests 50000
+
+Imports the API middleware, so it needs the API environment (.env).
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from typing import Callable, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "api", "src"))
+
+from starlette.requests import Request
+
+from controllers.middleware import RateLimiter, RequestPipelineMiddleware, RequestValidator
+from controllers.monitoring import MonitoringMiddleware
+from controllers.rate_limit import MemoryRateLimitBackend
+
+class LegacyLayer:
+    """Previous middleware shape: a Request object and a prefix scan per layer."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope=scope, receive=receive)
+        request.headers.get("content-type", "")
+        request.headers.get("x-forwarded-for")
+        endpoints = ["/api/v1/auth/token", "/api/v1/auth/register", "/api/v1/auth/password-reset"]
+        any(request.url.path.startswith(endpoint) for endpoint in endpoints)
+        await self.app(scope, receive, send)
+
+def make_scopes(count: int) -> List[dict]:
+    """Mostly regular API calls, with one in five hitting an auth endpoint from a distinct IP."""
+    scopes = []
+    for i in range(count):
+        path = "/api/v1/auth/token" if i % 5 == 0 else "/api/v1/rfm/analysis-history"
+        scopes.append({
+            "type": "http",
+            "method": "POST" if i % 5 == 0 else "GET",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "headers": [
+                (b"host", b"api.rfminsights.com.br"),
+                (b"content-type", b"application/json"),
+                (b"content-length", b"64"),
+                (b"x-forwarded-for", f"10.0.{i >> 8 & 255}.{i & 255}".encode()),
+                (b"user-agent", b"benchmark"),
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+            "scheme": "http",
+        })
+    return scopes
+
+async def run(name: str, stack: Callable, scopes: List[dict], report: bool = True) -> None:
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for scope in scopes:
+        await stack(dict(scope), receive, send)
+    elapsed = time.perf_counter() - start
+    if report:
+        print(f"{name:<10} {len(scopes):>8} requests  {elapsed * 1e6 / len(scopes):>8.2f} us/request")
+
+def rate_limiter(app) -> RateLimiter:
+    # Generous limits so the measurement covers the full path rather than early rejections
+    return RateLimiter(app, backend=MemoryRateLimitBackend(rate_limit=1000, time_window=60, block_time=300))
+
+async def main(requests: int) -> None:
+    async def app(scope, receive, send):
+        pass
+
+    scopes = make_scopes(requests)
+    stacks = {
+        "legacy": LegacyLayer(LegacyLayer(MonitoringMiddleware(LegacyLayer(app)))),
+        "stacked": RequestValidator(rate_limiter(MonitoringMiddleware(app))),
+        "pipeline": RequestPipelineMiddleware(app, rate_limiter=rate_limiter(app)),
+    }
+    for name, stack in stacks.items():
+        # Warm up, then measure
+        await run(name, stack, scopes[:1000], report=False)
+        await run(name, stack, scopes)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Middleware overhead benchmark")
+    parser.add_argument("--requests", type=int, default=50000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,145 @@
+"""Microbenchmark of the authentication rate limiter.
+
+Measures per-request cost and memory of the rate limit backends with a large
+number of distinct client IPs, as seen during a credential-stuffing burst, and
+compares them with the previous list-of-timestamps implementation.
+
+Usage:
+    python scripts/benchmark_rate_limiter.py --ips 100000 --requests-per-ip 3
+    python scripts/benchmark_rate_limiter.py --backend shared --shm-path /dev/shm/rate_limit_bench
+    python scripts/benchmark_rate_limiter.py --backend redis --redis-url redis://localhost:6379/15
+
+The ASGI pass imports the API middleware, so it needs the API environment (.env).
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tracemalloc
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api", "src"))
+
+from controllers.rate_limit import MemoryRateLimitBackend, create_rate_limit_backend
+
+def legacy_limiter(rate_limit: int, time_window: int) -> Tuple[Callable[[str], bool], Dict]:
+    """Previous implementation: a timestamp list per IP, rebuilt on every request and never evicted."""
+    requests: Dict[str, List[float]] = defaultdict(list)
+
+    def check(client_ip: str) -> bool:
+        current_time = time.time()
+        requests[client_ip] = [t for t in requests[client_ip] if current_time - t < time_window]
+        if len(requests[client_ip]) >= rate_limit:
+            return False
+        requests[client_ip].append(current_time)
+        return True
+
+    return check, requests
+
+def memory_limiter(max_keys: int) -> Tuple[Callable[[str], object], Dict]:
+    backend = MemoryRateLimitBackend(rate_limit=5, time_window=60, block_time=300, max_keys=max_keys)
+    return backend.check, backend.buckets
+
+def drive(check: Callable[[str], object], ips: List[str], requests_per_ip: int) -> None:
+    for _ in range(requests_per_ip):
+        for ip in ips:
+            check(ip)
+
+def run(name: str, factory: Callable[[], Tuple[Callable[[str], object], Dict]], ips: List[str], requests_per_ip: int) -> None:
+    # Timing and memory are measured on separate runs, since tracemalloc slows allocations down
+    check, _ = factory()
+    start = time.perf_counter()
+    drive(check, ips, requests_per_ip)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    check, table = factory()
+    drive(check, ips, requests_per_ip)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = len(ips) * requests_per_ip
+    print(
+        f"{name:<10} {total:>9} requests  {elapsed * 1e9 / total:>8.0f} ns/request  "
+        f"{len(table):>7} keys  {peak / 1024 / 1024:>7.1f} MiB peak"
+    )
+
+async def run_backend(name: str, backend, ips: List[str], requests_per_ip: int) -> None:
+    """Time a shared backend through its async interface."""
+    start = time.perf_counter()
+    for _ in range(requests_per_ip):
+        for ip in ips:
+            await backend.hit(ip)
+    elapsed = time.perf_counter() - start
+    total = len(ips) * requests_per_ip
+    print(f"{name:<10} {total:>9} requests  {elapsed * 1e9 / total:>8.0f} ns/request")
+
+async def run_asgi(ips: List[str], max_keys: int) -> None:
+    """Full middleware path, including request parsing, for a sample of IPs."""
+    from controllers.middleware import RateLimiter
+
+    async def app(scope, receive, send):
+        pass
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    limiter = RateLimiter(
+        app,
+        backend=MemoryRateLimitBackend(rate_limit=5, time_window=60, block_time=300, max_keys=max_keys)
+    )
+    scopes = [
+        {
+            "type": "http",
+            "method": "POST",
+            "path": "/api/auth/token",
+            "raw_path": b"/api/auth/token",
+            "query_string": b"",
+            "headers": [(b"x-forwarded-for", ip.encode())],
+            "client": (ip, 50000),
+            "server": ("testserver", 80),
+            "scheme": "http",
+        }
+        for ip in ips
+    ]
+    start = time.perf_counter()
+    for scope in scopes:
+        await limiter(scope, receive, send)
+    elapsed = time.perf_counter() - start
+    print(f"{'asgi':<10} {len(scopes):>9} requests  {elapsed * 1e9 / len(scopes):>8.0f} ns/request")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rate limiter microbenchmark")
+    parser.add_argument("--ips", type=int, default=100000, help="Distinct client IPs")
+    parser.add_argument("--requests-per-ip", type=int, default=3)
+    parser.add_argument("--max-keys", type=int, default=50000, help="Key table cap of the memory backend")
+    parser.add_argument("--backend", choices=["memory", "shared", "redis"], default="memory")
+    parser.add_argument("--shm-path", default="/dev/shm/rfm_rate_limit_benchmark")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--skip-asgi", action="store_true", help="Skip the full middleware pass")
+    args = parser.parse_args()
+
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.ips)]
+
+    if args.backend == "memory":
+        run("legacy", lambda: legacy_limiter(rate_limit=5, time_window=60), ips, args.requests_per_ip)
+        run("memory", lambda: memory_limiter(args.max_keys), ips, args.requests_per_ip)
+    elif args.backend == "shared":
+        backend = create_rate_limit_backend("shared", 5, 60, 300, path=args.shm_path)
+        asyncio.run(run_backend("shared", backend, ips, args.requests_per_ip))
+        os.remove(args.shm_path)
+    else:
+        backend = create_rate_limit_backend("redis", 5, 60, 300, url=args.redis_url)
+        asyncio.run(run_backend("redis", backend, ips, args.requests_per_ip))
+
+    if not args.skip_asgi:
+        asyncio.run(run_asgi(ips[:min(len(ips), 20000)], args.max_keys))
+
+if __name__ == "__main__":
+    main()
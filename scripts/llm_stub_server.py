@@ -0,0 +1,166 @@
+"""Local OpenAI-compatible stub server for offline load testing.
+
+Serves POST /v1/chat/completions (plain and streaming) with deterministic
+content, a configurable latency distribution and injected errors, so the LLM
+endpoints can be benchmarked without network access or API costs.
+
+Usage:
+    python scripts/llm_stub_server.py --port 8089 --latency-ms 800 --error-rate-429 0.05
+
+Then start the API with LLM_BASE_URL=http://localhost:8089/v1 and any OPENAI_API_KEY.
+"""
+
+import sys
+import json
+import time
+import math
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+import logging
+from collections import Counter
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "oferta exclusiva para você cliente especial aproveite desconto hoje "
+    "frete grátis novidades coleção compre agora válido até domingo "
+    "obrigado pela preferência sentimos sua falta volte"
+).split()
+
+class StubSettings:
+    def __init__(self, args: argparse.Namespace):
+        self.latency_ms = args.latency_ms
+        self.latency_sigma = args.latency_sigma
+        self.tokens_per_second = args.tokens_per_second
+        self.error_rate_429 = args.error_rate_429
+        self.error_rate_500 = args.error_rate_500
+        self.retry_after = args.retry_after
+        self.random = random.Random(args.seed)
+
+    def latency(self) -> float:
+        """Draw a time-to-first-token in seconds from a log-normal distribution."""
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.random.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+def _completion_text(messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Build a deterministic answer from the prompt, so identical requests get identical text."""
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).digest()
+    rng = random.Random(digest)
+    length = min(max_tokens, rng.randint(20, 80))
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+def _error(status_code: int, message: str, error_type: str, headers: Dict[str, str] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+        headers=headers
+    )
+
+def create_app(settings: StubSettings) -> FastAPI:
+    app = FastAPI(title="LLM stub server")
+    stats = Counter()
+
+    @app.get("/stats")
+    async def get_stats():
+        return dict(stats)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        roll = settings.random.random()
+        if roll < settings.error_rate_429:
+            stats["429"] += 1
+            return _error(
+                429, "Rate limit reached (stub)", "rate_limit_exceeded",
+                headers={"Retry-After": str(settings.retry_after)}
+            )
+        if roll < settings.error_rate_429 + settings.error_rate_500:
+            stats["500"] += 1
+            return _error(500, "Internal server error (stub)", "server_error")
+
+        model = body.get("model", "stub")
+        messages = body.get("messages", [])
+        text = _completion_text(messages, int(body.get("max_tokens") or 256))
+        words = text.split(" ")
+        prompt_tokens = sum(len(str(message.get("content", ""))) // 4 + 4 for message in messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        await asyncio.sleep(settings.latency())
+
+        if not body.get("stream"):
+            stats["completions"] += 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(words),
+                    "total_tokens": prompt_tokens + len(words)
+                }
+            }
+
+        def chunk(delta: Dict[str, str], finish_reason: str = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(words):
+                if settings.tokens_per_second > 0:
+                    await asyncio.sleep(1 / settings.tokens_per_second)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+            stats["streams"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800, help="Median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal spread of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Streaming speed (0 for no delay)")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--error-rate-500", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency and error injection")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    logger.info(f"Starting LLM stub server on http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(StubSettings(args)), host=args.host, port=args.port, log_level="warning")
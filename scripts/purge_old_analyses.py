@@ -0,0 +1,75 @@
+"""Retention job: delete RFM analyses older than the retention period.
+
+Customer records of each analysis are removed by dropping its partition, so the
+job stays cheap however many rows an analysis has. Run it daily, e.g. from cron:
+    0 3 * * * cd /app && python scripts/purge_old_analyses.py
+
+Usage:
+    python scripts/purge_old_analyses.py --days 365
+    python scripts/purge_old_analyses.py --dry-run
+
+Uses DATABASE_URL, UPLOAD_DIR and ANALYSIS_RETENTION_DAYS from the environment.
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import SessionLocal
+from backend.models import RFMAnalysis
+from backend.utils.file_processor import FileProcessor
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def purge(days: int, upload_dir: str, dry_run: bool = False) -> int:
+    """Delete analyses older than the given number of days, with their uploaded files.
+
+    Args:
+        days: Retention period
+        upload_dir: Directory holding one subdirectory of files per analysis
+        dry_run: Only report what would be deleted
+
+    Returns:
+        Number of analyses deleted (or that would be)
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    db = SessionLocal()
+    try:
+        if dry_run:
+            count = db.query(RFMAnalysis).filter(RFMAnalysis.analysis_date < cutoff).count()
+            logger.info(f"{count} analyses older than {cutoff:%Y-%m-%d} would be deleted")
+            return count
+
+        analysis_ids = FileProcessor(upload_dir).delete_analyses_before(db, cutoff)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    # Files go only once the rows are gone, so a failed run never leaves analyses without their files
+    for analysis_id in analysis_ids:
+        shutil.rmtree(os.path.join(upload_dir, analysis_id), ignore_errors=True)
+    logger.info(f"Deleted {len(analysis_ids)} analyses older than {cutoff:%Y-%m-%d}")
+    return len(analysis_ids)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete RFM analyses past the retention period")
+    parser.add_argument("--days", type=int, default=int(os.getenv("ANALYSIS_RETENTION_DAYS", "365")))
+    parser.add_argument("--upload-dir", default=os.getenv("UPLOAD_DIR", "./uploads"))
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if args.days < 1:
+        parser.error("--days must be at least 1")
+    purge(args.days, args.upload_dir, args.dry_run)